@@ -0,0 +1,185 @@
+'''
+    Headless benchmark of the game scenes.
+    Runs with SDL's dummy video driver, so no display (or GPU) is needed. Every run uses fixed seeds, a fixed
+    update step, and scripted input, so numbers are repeatable between builds.
+
+    python bench.py [--frames N] [--seed N] [--json FILE] [--min-fps FPS] [--tracemalloc] [scene ...]
+    python bench.py --replay LOG [--json FILE]
+
+    With --replay, a session recorded with `python gb.py --record LOG` is played back instead, as fast as possible.
+'''
+import os
+import sys
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+import pygame
+import game
+
+gbe = game.gbe
+
+FRAME_MS = 1000.0 / 60.0
+
+# Scene name -> (state name, render mode of the scene's game map or None, frames between key presses, key names).
+SCENARIOS = {
+    "mainmenu":("MAIN_MENU", None, 30, ["s", "w", "s", "s", "w", "w"]),
+    "editor_topdown":("Editor", 0, 10, ["w", "d", "space", "e", "w", "w", "a", "space", "s", "q"]),
+    "editor_perspective":("Editor", 1, 10, ["w", "d", "space", "e", "w", "w", "a", "space", "s", "q"])
+}
+
+
+def _PressKey(key_name):
+    gbe.events.Events.emit("KEYPRESSED", {"key":gbe.actions.key_code(key_name), "mod":0, "key_name":key_name})
+
+
+def _Setup():
+    d = gbe.display.Display
+    d.init(640, 480)
+    sm = gbe.statemachine.StateMachine()
+    sm.register_node(game.scenes.mainmenu.get())
+    sm.register_node(game.scenes.editor.get())
+    return sm
+
+def _Activate(sm, scenario):
+    state, render_mode, interval, keys = SCENARIOS[scenario]
+    sm.activate_node(state)
+    if render_mode is not None:
+        game.scenes.editor.get().get_node("GameMap").set_render_mode(render_mode)
+
+def _Drive(sm, scenario, frames, seed):
+    state, render_mode, interval, keys = SCENARIOS[scenario]
+    random.seed(seed)
+    for i in range(0, frames):
+        gbe.events.pollEmitter()
+        if i % interval == 0:
+            _PressKey(keys[(i // interval) % len(keys)])
+        sm.update(FRAME_MS)
+        sm.render()
+
+def _GCCollections():
+    return sum([s["collections"] for s in gc.get_stats()])
+
+
+def run_scenario(sm, scenario, frames, seed, trace_alloc=False):
+    _Activate(sm, scenario)
+    _Drive(sm, scenario, min(frames, 30), seed) # Warm up caches and resources.
+    result = {"scene":scenario, "frames":frames, "seed":seed}
+
+    # Plain timing pass.
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    collections = _GCCollections()
+    start = time.perf_counter()
+    _Drive(sm, scenario, frames, seed)
+    elapsed = time.perf_counter() - start
+    result["fps"] = frames / elapsed if elapsed > 0 else 0.0
+    result["frame_ms"] = (elapsed / frames) * 1000.0
+    result["gc_collections"] = _GCCollections() - collections
+    result["net_blocks"] = sys.getallocatedblocks() - blocks
+
+    # Profiled pass for the per-phase break down.
+    prof = gbe.profiler.Profiler
+    prof.capacity = frames
+    prof.clear()
+    prof.enable()
+    _Drive(sm, scenario, frames, seed)
+    prof.disable()
+    summary = prof.summary()
+    result["phases_ms"] = summary["phases"]
+    result["top_nodes_ms"] = [list(n) for n in summary["nodes"][0:5]]
+
+    if trace_alloc:
+        tracemalloc.start()
+        _Drive(sm, scenario, frames, seed)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["traced_peak_bytes"] = peak
+    return result
+
+
+def run_replay(sm, filename):
+    sm.activate_node("MAIN_MENU") # Recordings start where the game does.
+    sched = gbe.scheduler.Scheduler(sm)
+    gc.collect()
+    collections = _GCCollections()
+    times = gbe.replay.play(sched, filename)
+    result = {"replay":filename, "frames":len(times), "gc_collections":_GCCollections() - collections}
+    if len(times) > 0:
+        ordered = sorted(times)
+        pick = lambda p: ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+        result["frame_ms"] = {
+            "mean":sum(times) / len(times),
+            "p50":pick(0.5),
+            "p95":pick(0.95),
+            "p99":pick(0.99),
+            "max":ordered[-1]
+        }
+    return result
+
+def _ReportReplay(result):
+    print("{}: {} frames, {} gc collections".format(result["replay"], result["frames"], result["gc_collections"]))
+    if "frame_ms" in result:
+        print("    " + "  ".join(["{} {:.3f}".format(k, v) for k, v in result["frame_ms"].items()]))
+
+
+def _Report(results):
+    for r in results:
+        print("{}: {:.1f} fps ({:.3f} ms/frame) over {} frames, {} gc collections, {} net blocks".format(
+            r["scene"], r["fps"], r["frame_ms"], r["frames"], r["gc_collections"], r["net_blocks"]))
+        print("    " + "  ".join(["{} {:.3f}".format(p, t) for p, t in sorted(r["phases_ms"].items())]))
+        for phase, name, t in r["top_nodes_ms"]:
+            print("    {:<10} {:<28} {:.3f}".format(phase, name, t))
+        if "traced_peak_bytes" in r:
+            print("    traced peak {} bytes".format(r["traced_peak_bytes"]))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless scene benchmark.")
+    parser.add_argument("scenes", nargs="*", default=list(SCENARIOS.keys()), help="Scenes to run. Default: all")
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=64)
+    parser.add_argument("--json", default=None, help="Also write the results to this file.")
+    parser.add_argument("--min-fps", type=float, default=0.0, help="Exit with an error if any scene runs slower.")
+    parser.add_argument("--tracemalloc", action="store_true", help="Add a pass measuring peak Python memory.")
+    parser.add_argument("--replay", default=None, help="Play back a recorded session instead of the scenes.")
+    args = parser.parse_args(argv)
+
+    if args.replay is not None:
+        sm = _Setup()
+        result = run_replay(sm, args.replay)
+        sm.close()
+        gbe.display.Display.close()
+        _ReportReplay(result)
+        if args.json is not None:
+            with open(args.json, "w") as f:
+                json.dump(result, f, indent=4)
+        return 0
+
+    for s in args.scenes:
+        if s not in SCENARIOS:
+            parser.error("Unknown scene '{}'. Choose from: {}".format(s, ", ".join(SCENARIOS.keys())))
+
+    sm = _Setup()
+    results = [run_scenario(sm, s, args.frames, args.seed, args.tracemalloc) for s in args.scenes]
+    sm.close()
+    gbe.display.Display.close()
+
+    _Report(results)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+    for r in results:
+        if r["fps"] < args.min_fps:
+            print("{} is below the minimum of {} fps.".format(r["scene"], args.min_fps))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
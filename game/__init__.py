@@ -27,7 +27,7 @@ def _OnKeyEvent(event, data):
 
 
 
-def start():
+def start(profile=False, record=None):
     global _RUNNING, _OnKeyEvent, _OnQuit, _OnVideoResize
     sm = gbe.statemachine.StateMachine()
 
@@ -64,11 +64,28 @@ def start():
     sm.register_node(scenes.editor.get())
     sm.activate_node("MAIN_MENU")
 
+    sched = gbe.scheduler.Scheduler(sm)
+
+    prof = gbe.profiler.Profiler
+    if profile == True:
+        logs = gbe.resource.ResourceManager().game_path
+        prof.overlay = gbe.profiler.NodeProfilerOverlay(font_src="IttyBitty.ttf")
+        prof.enable()
+        prof.trace_to(gbe.resource.join_path(logs, "logs/profile.csv"))
+
+    if record is not None:
+        sched.record_to(gbe.resource.join_path(gbe.resource.ResourceManager().game_path, record))
+
     _RUNNING = True
-    while _RUNNING:
-        gbe.events.pollEmitter()
-        sm.update()
-        sm.render()
+    try:
+        while _RUNNING:
+            sched.step()
+    finally:
+        # Always flush the log, so a crash can still be replayed.
+        sched.stop_recording()
+    if prof.enabled:
+        prof.stop_trace()
+        prof.disable()
     sm.close()
     d.close()
 
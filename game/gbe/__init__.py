@@ -9,4 +9,9 @@ from . import display
 from . import events
 from . import nodes
 from . import resource
+from . import text
+from . import actions
 from . import statemachine
+from . import scheduler
+from . import replay
+from . import profiler
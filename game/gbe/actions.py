@@ -0,0 +1,166 @@
+import pygame
+from .events import Events
+from .resource import ResourceManager
+
+
+class ActionError(Exception):
+    pass
+
+
+_KEYCODES = None # key name -> key code, for pygame versions without pygame.key.key_code()
+
+def key_code(name):
+    """
+    Returns the key code for a key name, as given by pygame.key.name(), or None if there's no such key.
+    """
+    global _KEYCODES
+    if hasattr(pygame.key, "key_code"):
+        try:
+            return pygame.key.key_code(name)
+        except ValueError:
+            return None
+    if _KEYCODES is None:
+        _KEYCODES = {}
+        for cname in dir(pygame.constants):
+            if cname.startswith("K_"):
+                code = getattr(pygame.constants, cname)
+                _KEYCODES.setdefault(pygame.key.name(code), code)
+    return _KEYCODES.get(name)
+
+
+class _Actions:
+    """
+    Maps keys and buttons to named actions, and emits an "ACTION" signal whenever a bound key or button is pressed.
+    Bindings are strings: a key name ("w", "return"), "mouse:<button>", or "joy:<button>" for that button on any
+    joystick. The signal's data is that of the KEYPRESSED, MOUSEBUTTONPRESSED or JOYBUTTONPRESSED event, plus
+    "action".
+    """
+    def __init__(self):
+        self._src = None
+        self._bindings = {} # action -> list of bindings
+        # Compiled from _bindings. Input code -> tuple of actions.
+        self._keys = {}
+        self._mbuttons = {}
+        self._jbuttons = {}
+        Events.listen("KEYPRESSED", self._OnKeyPressed)
+        Events.listen("MOUSEBUTTONPRESSED", self._OnMouseButtonPressed)
+        Events.listen("JOYBUTTONPRESSED", self._OnJoyButtonPressed)
+
+    @property
+    def actions(self):
+        return tuple(self._bindings.keys())
+
+    @property
+    def source(self):
+        """
+        The binding file last loaded, or None.
+        """
+        return self._src
+
+    def load(self, src, force=False):
+        """
+        Replaces all bindings with those in a JSON file of the "json" resource type. The file holds an object
+        mapping each action to a list of bindings. Nothing is done if src is already loaded, unless force is True.
+        """
+        if src == self._src and force == False:
+            return
+        rm = ResourceManager()
+        if not rm.is_valid("json", src):
+            raise ActionError("Binding file '{}' not found.".format(src))
+        if not rm.has("json", src):
+            rm.store("json", src)
+        res = rm.get("json", src)
+        if res is None or res() is None:
+            raise ActionError("Failed to load binding file '{}'.".format(src))
+        data = res().data
+        if not isinstance(data, dict):
+            raise ActionError("Binding file '{}' does not contain an object.".format(src))
+        bindings = {}
+        for action in data:
+            if not isinstance(data[action], list):
+                raise ActionError("Bindings for action '{}' are not a list.".format(action))
+            bindings[action] = []
+            for binding in data[action]:
+                self._ParseBinding(binding) # Raises on bad bindings, before anything is replaced.
+                bindings[action].append(binding)
+        self._bindings = bindings
+        self._src = src
+        self._Compile()
+
+    def bind(self, action, binding):
+        self._ParseBinding(binding)
+        bindings = self._bindings.setdefault(action, [])
+        if binding not in bindings:
+            bindings.append(binding)
+            self._Compile()
+
+    def unbind(self, action, binding=None):
+        """
+        Removes a binding from an action, or the whole action if binding is None.
+        """
+        if action not in self._bindings:
+            return
+        if binding is None:
+            del self._bindings[action]
+        elif binding in self._bindings[action]:
+            self._bindings[action].remove(binding)
+        else:
+            return
+        self._Compile()
+
+    def get_bindings(self, action):
+        return tuple(self._bindings.get(action, ()))
+
+    def to_dict(self):
+        return {action:list(self._bindings[action]) for action in self._bindings}
+
+    def _ParseBinding(self, binding):
+        # Returns (table, code) for a binding string.
+        if not isinstance(binding, str):
+            raise ActionError("Expected a binding string.")
+        parts = binding.split(":")
+        if len(parts) == 2 and parts[0] in ("mouse", "joy"):
+            try:
+                button = int(parts[1])
+            except ValueError:
+                raise ActionError("Invalid button in binding '{}'.".format(binding))
+            return (self._mbuttons if parts[0] == "mouse" else self._jbuttons, button)
+        code = key_code(binding)
+        if code is None:
+            raise ActionError("Unknown key in binding '{}'.".format(binding))
+        return (self._keys, code)
+
+    def _Compile(self):
+        self._keys = {}
+        self._mbuttons = {}
+        self._jbuttons = {}
+        for action in self._bindings:
+            for binding in self._bindings[action]:
+                table, code = self._ParseBinding(binding)
+                actions = table.get(code, ())
+                if action not in actions:
+                    table[code] = actions + (action,)
+
+    def _Emit(self, actions, data):
+        for action in actions:
+            adata = dict(data)
+            adata["action"] = action
+            Events.emit("ACTION", adata)
+
+    def _OnKeyPressed(self, event, data):
+        actions = self._keys.get(data["key"])
+        if actions is not None:
+            self._Emit(actions, data)
+
+    def _OnMouseButtonPressed(self, event, data):
+        actions = self._mbuttons.get(data["button"])
+        if actions is not None:
+            self._Emit(actions, data)
+
+    def _OnJoyButtonPressed(self, event, data):
+        actions = self._jbuttons.get(data["button"])
+        if actions is not None:
+            self._Emit(actions, data)
+
+# The one and only action map.
+Actions = _Actions()
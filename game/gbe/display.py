@@ -29,6 +29,11 @@ class _Display:
         self._display_surface = None
         self._display_flags = Flag.HWSURFACE | Flag.DOUBLEBUF
         self._clear_color = pygame.Color(0,0,0)
+        self._damage = {
+            "enabled":False,
+            "full":True,
+            "rects":[]
+        }
 
     @property
     def init(self):
@@ -80,6 +85,23 @@ class _Display:
     def opengl(self):
         return Flag.isSet(self._display_flags, Flag.OPENGL)
 
+    @property
+    def damage_tracking(self):
+        return self._damage["enabled"]
+    @damage_tracking.setter
+    def damage_tracking(self, enable):
+        self._damage["enabled"] = (enable == True)
+        self._damage["full"] = True
+        self._damage["rects"] = []
+
+    @property
+    def dirty(self):
+        return self._damage["full"] or len(self._damage["rects"]) > 0
+
+    @property
+    def full_redraw(self):
+        return self._damage["full"]
+
     @property
     def caption(self):
         if pygame.display.get_init():
@@ -112,17 +134,42 @@ class _Display:
         self._display_surface = pygame.display.set_mode(resolution, flags)
         self._display_flags = self._display_surface.get_flags()
         self._resolution = self._display_surface.get_size()
+        self.mark_dirty()
         return self
 
+    def mark_dirty(self, rect=None):
+        """
+        Flags an area of the display as needing a redraw. None flags the whole display.
+        """
+        if rect is None:
+            self._damage["full"] = True
+            self._damage["rects"] = []
+        elif not self._damage["full"]:
+            self._damage["rects"].append(pygame.Rect(rect))
+
+    def get_dirty_rects(self):
+        if self._damage["full"]:
+            if self._display_surface is None:
+                return []
+            return [self._display_surface.get_rect()]
+        return list(self._damage["rects"])
+
+    def clear_dirty(self):
+        self._damage["full"] = False
+        self._damage["rects"] = []
+
 
     def clear(self):
         if self._display_surface is not None:
             self._display_surface.fill(self._clear_color)
 
 
-    def flip(self):
+    def flip(self, rects=None):
         if self._init:
-            pygame.display.flip()
+            if rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(rects)
 
     def init(self, width=0, height=0):
         if self._init == False:
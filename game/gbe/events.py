@@ -8,12 +8,12 @@ import time
 import weakref
 import pygame
 
-def _getWeakRef(fn):
+def _getWeakRef(fn, callback=None):
     if not hasattr(fn, "__call__"):
         return None
     if hasattr(fn, "__self__"):
-        return weakref.WeakMethod(fn)
-    return weakref.ref(fn)
+        return weakref.WeakMethod(fn, callback)
+    return weakref.ref(fn, callback)
 
 
 class EventError(Exception):
@@ -21,146 +21,362 @@ class EventError(Exception):
 
 class _Events:
     def __init__(self):
+        # signal -> {weakref:None}. Used as an insertion ordered set. Weak references compare (and hash) by what
+        # they refer to, so a fresh reference to the same callback finds the stored one.
         self._signals = {}
+        # signal -> tuple of the signal's listeners, rebuilt on the next emit after they change. Listeners may
+        # listen or unlisten while a signal is being emitted.
+        self._dispatch = {}
+        # Batch listeners, stored like _signals, and the data emitted for them since the last flush.
+        self._batches = {}
+        self._pending = {}
+        self._coalesce = False
 
-    def _ClearUnreferenced(self):
-        for signal in self._signals:
-            removal = [s for s in self._signals[signal] if s() is None]
-            for r in removal:
-                self._signals[signal].remove(r)
+    @property
+    def coalesce(self):
+        """
+        If True, pollEmitter() merges runs of motion, axis and resize events into one event per device.
+        """
+        return self._coalesce
+    @coalesce.setter
+    def coalesce(self, enable):
+        self._coalesce = (enable == True)
 
-    def listen(self, signal, fn):
-        ref = _getWeakRef(fn)
+    def _OnCollected(self, table, signal, ref):
+        # A listener was garbage collected. Once dead, references only compare equal to themselves, so this can't
+        # remove a newer listener for the same callback.
+        listeners = table.get(signal)
+        if listeners is not None and ref in listeners:
+            del listeners[ref]
+            self._dispatch.pop(signal, None)
+
+    def listen(self, signal, fn, batch=False):
+        """
+        Calls fn(signal, data) whenever signal is emitted. If batch is True, fn(signal, [data, ...]) is instead
+        called once a frame, from pollEmitter(), with everything emitted for the signal since the last call.
+        """
+        table = self._batches if batch == True else self._signals
+        ref = _getWeakRef(fn, lambda r: self._OnCollected(table, signal, r))
         if ref is None or ref() is None:
             raise EventError("Expected a function callback.") 
-        if not signal in self._signals:
-            self._signals[signal] = []
-        if not ref in self._signals[signal]:
-            self._signals[signal].append(ref)
+        listeners = table.get(signal)
+        if listeners is None:
+            listeners = {}
+            table[signal] = listeners
+        if not ref in listeners:
+            listeners[ref] = None
+            self._dispatch.pop(signal, None)
 
     def unlisten(self, signal, fn):
         ref = _getWeakRef(fn)
         if ref is None or ref() is None:
             return # Not a function. Nothing to do.
-        if signal in self._signals:
-            if ref in self._signals[signal]:
-                self._signals[signal].remove(ref)
+        for table in (self._signals, self._batches):
+            listeners = table.get(signal)
+            if listeners is not None and ref in listeners:
+                del listeners[ref]
+                self._dispatch.pop(signal, None)
 
     def unlisten_all(self, signal):
-        if signal in self._signals:
-            del self._signals[signal]
+        self._signals.pop(signal, None)
+        self._batches.pop(signal, None)
+        self._pending.pop(signal, None)
+        self._dispatch.pop(signal, None)
 
     def emit(self, signal, data):
-       if signal in self._signals:
-           for r in self._signals[signal]:
+        listeners = self._dispatch.get(signal)
+        if listeners is None:
+            refs = self._signals.get(signal)
+            listeners = tuple(refs) if refs is not None else ()
+            self._dispatch[signal] = listeners
+        for r in listeners:
+            fn = r()
+            if fn is not None:
+                fn(signal, data)
+        if signal in self._batches:
+            pending = self._pending.get(signal)
+            if pending is None:
+                self._pending[signal] = [data]
+            else:
+                pending.append(data)
+
+    def _FlushBatches(self):
+        """
+        Hands batch listeners everything emitted for them since the last flush. Returns the number of signals flushed.
+        """
+        if len(self._pending) <= 0:
+            return 0
+        pending = self._pending
+        self._pending = {}
+        for signal in pending:
+            refs = self._batches.get(signal)
+            if refs is None:
+                continue
+            for r in tuple(refs):
                 fn = r()
                 if fn is not None:
-                   fn(signal, data)
-       self._ClearUnreferenced()
+                    fn(signal, pending[signal])
+        return len(pending)
 
 # Create the actual Events instance :)
 Events = _Events()
 
 
-_ClickDelayMax=500 # in Milliseconds
-_DOWNKEYS=[]
-_DOWNMBUTTONS=[]
-_DOWNJBUTTONS=[]
+_ClickDelayMax=500 # Default, in Milliseconds
+_RECORDER=None # Set by replay.Recorder while recording.
+_KEYNAMES={} # key code -> pygame.key.name()
 
-def _WatchKey(key):
-    global _DOWNKEYS
-    for k in _DOWNKEYS:
-        if k[0] == key:
+def _KeyName(key):
+    name = _KEYNAMES.get(key)
+    if name is None:
+        name = pygame.key.name(key)
+        _KEYNAMES[key] = name
+    return name
+
+
+class _InputState:
+    """
+    Tracks which keys and buttons are held down. Inputs are given as a code and a device: None for a key code,
+    -1 for a mouse button, and a joystick id for a joystick button. Times are in milliseconds.
+    A frame, for pressed_this_frame() and released_this_frame(), runs from one StateMachine update to the next, so
+    every update sees each press and release exactly once.
+    """
+    def __init__(self, click_delay_max=_ClickDelayMax):
+        self._clickDelayMax = click_delay_max
+        self._down = {} # (device, code) -> tick it went down
+        self._pressed = set() # (device, code) that went down since the last update
+        self._released = set() # (device, code) that went up since the last update
+
+    @property
+    def click_delay_max(self):
+        """
+        The longest a key or button can be held, and still count as pressed when released.
+        """
+        return self._clickDelayMax
+    @click_delay_max.setter
+    def click_delay_max(self, delay):
+        if not isinstance(delay, int):
+            raise TypeError("Expected integer value.")
+        if delay < 0:
+            raise ValueError("Delay cannot be negative.")
+        self._clickDelayMax = delay
+
+    def _Tick(self):
+        return int(time.monotonic() * 1000)
+
+    def is_down(self, code, device=None):
+        return (device, code) in self._down
+
+    def held_for(self, code, device=None):
+        """
+        Returns how long the input has been held down, or 0 if it isn't.
+        """
+        tick = self._down.get((device, code))
+        if tick is None:
+            return 0
+        return self._Tick() - tick
+
+    def pressed_this_frame(self, code, device=None):
+        return (device, code) in self._pressed
+
+    def released_this_frame(self, code, device=None):
+        return (device, code) in self._released
+
+    def _NextFrame(self):
+        if len(self._pressed) > 0:
+            self._pressed = set()
+        if len(self._released) > 0:
+            self._released = set()
+
+    def _Press(self, device, code):
+        key = (device, code)
+        if key in self._down:
             return # Already watching. Technically, this should never happen.
-    _DOWNKEYS.append((key, int(round(time.time()*1000))))
+        self._down[key] = self._Tick()
+        self._pressed.add(key)
+
+    def _Release(self, device, code):
+        """
+        Returns how long the input was held down, or None if it wasn't.
+        """
+        tick = self._down.pop((device, code), None)
+        if tick is None:
+            return None # We found nothing, boss.
+        self._released.add((device, code))
+        return self._Tick() - tick
+
+    def _ReleaseAll(self):
+        # Without focus, releases are never seen. Drop everything rather than leave inputs stuck down.
+        self._released.update(self._down)
+        self._down = {}
+
+# The one and only input state.
+Input = _InputState()
+
+
+def _Emit(signal, data):
+    # Everything pollEmitter() emits goes through here, so it can be recorded.
+    if _RECORDER is not None:
+        _RECORDER.record(signal, data)
+    Events.emit(signal, data)
+
+def _Replay(signal, data):
+    """
+    Emits a recorded event, keeping Input up to date as _EmitEvent() would. Clicks aren't derived again, as
+    they were recorded as events of their own.
+    """
+    if signal in ("KEYDOWN", "MOUSEBUTTONDOWN", "JOYBUTTONDOWN"):
+        Input._Press(*_ReplayInput(signal, data))
+        Events.emit(signal, data)
+    elif signal in ("KEYUP", "MOUSEBUTTONUP", "JOYBUTTONUP"):
+        Events.emit(signal, data)
+        Input._Release(*_ReplayInput(signal, data))
+    else:
+        if signal == "INPUTFOCUSLOST":
+            Input._ReleaseAll()
+        Events.emit(signal, data)
+
+def _ReplayInput(signal, data):
+    # (device, code) of a recorded press or release.
+    if signal.startswith("KEY"):
+        return (None, data["key"])
+    elif signal.startswith("MOUSE"):
+        return (-1, data["button"])
+    return (data["joy"], data["button"])
+
+
+def _WatchKey(key):
+    Input._Press(None, key)
 def _ReleaseKey(key):
-    global _DOWNKEYS, _ClickDelayMax
-    tick = int(round(time.time()*1000))
-    for k in _DOWNKEYS:
-        if k[0] == key:
-            lastTick = k[1]
-            _DOWNKEYS.remove(k)
-            if tick - lastTick <= _ClickDelayMax:
-                Events.emit("KEYPRESSED", {"key":key, "mod":pygame.key.get_mods(), "key_name":pygame.key.name(key)})
-            return # Done.
-    # We found nothing, boss.
+    held = Input._Release(None, key)
+    if held is not None and held <= Input.click_delay_max:
+        _Emit("KEYPRESSED", {"key":key, "mod":pygame.key.get_mods(), "key_name":_KeyName(key)})
 
 
 def _WatchButton(device, button):
-    global _DOWNMBUTTONS, _DOWNJBUTTONS
-    tick = int(round(time.time()*1000))
-    btnsrc = _DOWNMBUTTONS
-    if device >= 0:
-        btnsrc = _DOWNJBUTTONS
-    for b in btnsrc:
-        if b[0] == device and b[1] == button:
-            return # Already Watching...
-    btnsrc.append((device, button, tick))
+    Input._Press(device, button)
 def _ReleaseButton(device, button):
-    global _DOWNMBUTTONS, _DOWNJBUTTONS, _ClickDelayMax
-    tick = int(round(time.time()*1000))
-    btnsrc = _DOWNMBUTTONS
-    if device >= 0:
-        btnsrc = _DOWNJBUTTONS
-    for b in btnsrc:
-        if b[0] == device and b[1] == button:
-            lastTick = b[2]
-            btnsrc.remove(b)
-            if tick - lastTick <= _ClickDelayMax:
-                if device >= 0:
-                    Events.emit("JOYBUTTONPRESSED", {"joy":device, "button":button})
-                else:
-                    Events.emit("MOUSEBUTTONPRESSED", {"pos":pygame.mouse.get_pos(), "button":button})
-            return # Done.
-    # We found nothing, boss.
-
-def pollEmitter():
+    held = Input._Release(device, button)
+    if held is not None and held <= Input.click_delay_max:
+        if device >= 0:
+            _Emit("JOYBUTTONPRESSED", {"joy":device, "button":button})
+        else:
+            _Emit("MOUSEBUTTONPRESSED", {"pos":pygame.mouse.get_pos(), "button":button})
+
+def _EmitEvent(event):
     global Events, _WatchKey, _ReleaseKey, _WatchButton, _ReleaseButton
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            Events.emit("QUIT", {})
-        elif event.type == pygame.KEYDOWN:
-            _WatchKey(event.key)
-            Events.emit("KEYDOWN", {"unicode":event.unicode, "key":event.key, "mod":event.mod, "key_name":pygame.key.name(event.key)})
-        elif event.type == pygame.KEYUP:
-            Events.emit("KEYUP", {"key":event.key, "mod":event.mod, "key_name":pygame.key.name(event.key)})
-            _ReleaseKey(event.key)
-        elif event.type == pygame.MOUSEMOTION: 
-            Events.emit("MOUSEMOTION", {"pos":event.pos, "rel":event.rel, "buttons":event.buttons})
-        elif event.type == pygame.MOUSEBUTTONUP:
-            Events.emit("MOUSEBUTTONUP", {"pos":event.pos, "button":event.button})
-            _ReleaseButton(-1, event.button)
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            _WatchButton(-1, event.button)
-            Events.emit("MOUSEBUTTONDOWN", {"pos":event.pos, "button":event.button})
-        elif event.type == pygame.VIDEORESIZE:
-            # NOTE: There is a resize bug in Linux. This will stop working after a short time. Grrr
-            Events.emit("VIDEORESIZE", {"size":event.size, "w":event.w, "h":event.h})
-        elif event.type == pygame.VIDEOEXPOSE:
-            Events.emit("VIDEOEXPOSE", {})
-        elif event.type == pygame.JOYAXISMOTION:
-            Events.emit("JOYAXISMOTION", {"joy":event.joy, "axis":event.axis, "value":event.value})
-        elif event.type == pygame.JOYBALLMOTION:
-            Events.emit("JOYBALLMOTION", {"joy":event.joy, "ball":event.ball, "res":event.rel})
-        elif event.type == pygame.JOYHATMOTION:
-            Events.emit("JOYHATMOTION", {"joy":event.joy, "hat":event.hat, "value":event.value})
-        elif event.type == pygame.JOYBUTTONUP:
-            Events.emit("JOYBUTTONUP", {"joy":event.joy, "button":event.button})
-            _ReleaseButton(event.joy, event.button)
-        elif event.type == pygame.JOYBUTTONDOWN:
-            _WatchButton(event.joy, event.button)
-            Events.emit("JOYBUTTONDOWN", {"joy":event.joy, "button":event.button})
-        elif event.type == pygame.ACTIVEEVENT:
-            if event.state == 1:
-                if event.gain == 0:
-                    Events.emit("FOCUSLOST", {})
-                elif event.gain == 1:
-                    Events.emit("FOCUSGAINED", {})
+    if event.type == pygame.QUIT:
+        _Emit("QUIT", {})
+    elif event.type == pygame.KEYDOWN:
+        _WatchKey(event.key)
+        _Emit("KEYDOWN", {"unicode":event.unicode, "key":event.key, "mod":event.mod, "key_name":_KeyName(event.key)})
+    elif event.type == pygame.KEYUP:
+        _Emit("KEYUP", {"key":event.key, "mod":event.mod, "key_name":_KeyName(event.key)})
+        _ReleaseKey(event.key)
+    elif event.type == pygame.MOUSEMOTION: 
+        _Emit("MOUSEMOTION", {"pos":event.pos, "rel":event.rel, "buttons":event.buttons})
+    elif event.type == pygame.MOUSEBUTTONUP:
+        _Emit("MOUSEBUTTONUP", {"pos":event.pos, "button":event.button})
+        _ReleaseButton(-1, event.button)
+    elif event.type == pygame.MOUSEBUTTONDOWN:
+        _WatchButton(-1, event.button)
+        _Emit("MOUSEBUTTONDOWN", {"pos":event.pos, "button":event.button})
+    elif event.type == pygame.VIDEORESIZE:
+        # NOTE: There is a resize bug in Linux. This will stop working after a short time. Grrr
+        _Emit("VIDEORESIZE", {"size":event.size, "w":event.w, "h":event.h})
+    elif event.type == pygame.VIDEOEXPOSE:
+        _Emit("VIDEOEXPOSE", {})
+    elif event.type == pygame.JOYAXISMOTION:
+        _Emit("JOYAXISMOTION", {"joy":event.joy, "axis":event.axis, "value":event.value})
+    elif event.type == pygame.JOYBALLMOTION:
+        _Emit("JOYBALLMOTION", {"joy":event.joy, "ball":event.ball, "res":event.rel})
+    elif event.type == pygame.JOYHATMOTION:
+        _Emit("JOYHATMOTION", {"joy":event.joy, "hat":event.hat, "value":event.value})
+    elif event.type == pygame.JOYBUTTONUP:
+        _Emit("JOYBUTTONUP", {"joy":event.joy, "button":event.button})
+        _ReleaseButton(event.joy, event.button)
+    elif event.type == pygame.JOYBUTTONDOWN:
+        _WatchButton(event.joy, event.button)
+        _Emit("JOYBUTTONDOWN", {"joy":event.joy, "button":event.button})
+    elif event.type == pygame.ACTIVEEVENT:
+        if event.state == 1:
+            if event.gain == 0:
+                _Emit("FOCUSLOST", {})
+            elif event.gain == 1:
+                _Emit("FOCUSGAINED", {})
+        if event.state & pygame.APPINPUTFOCUS:
+            if event.gain == 0:
+                Input._ReleaseAll()
+                _Emit("INPUTFOCUSLOST", {})
+            elif event.gain == 1:
+                _Emit("INPUTFOCUSGAINED", {})
+    else:
+        if hasattr(event, "code"):
+            _Emit("PYGUSER_{}".format(event.code), {})
         else:
-            if hasattr(event, "code"):
-                Events.emit("PYGUSER_{}".format(event.code), {})
-            else:
-                print("Unkown pygame event type '{}'".format(pygame.event.event_name(event.type)))
+            print("Unkown pygame event type '{}'".format(pygame.event.event_name(event.type)))
+
+def _CoalesceKey(event):
+    # Events that can be merged with others from the same source. Anything else returns None.
+    if event.type == pygame.MOUSEMOTION:
+        return (pygame.MOUSEMOTION,)
+    elif event.type == pygame.JOYAXISMOTION:
+        return (pygame.JOYAXISMOTION, event.joy, event.axis)
+    elif event.type == pygame.JOYBALLMOTION:
+        return (pygame.JOYBALLMOTION, event.joy, event.ball)
+    elif event.type == pygame.VIDEORESIZE:
+        return (pygame.VIDEORESIZE,)
+    return None
 
+def _Coalesce(events):
+    """
+    Merges each run of motion, axis and resize events, uninterrupted by any other event, into one event per source.
+    The merged event keeps the latest state, and motion events sum up their rel values.
+    """
+    result = []
+    run = {} # coalesce key -> index into result
+    for event in events:
+        key = _CoalesceKey(event)
+        if key is None:
+            run = {}
+            result.append(event)
+            continue
+        index = run.get(key)
+        if index is None:
+            run[key] = len(result)
+            result.append(event)
+            continue
+        last = result[index]
+        if event.type == pygame.MOUSEMOTION:
+            rel = (last.rel[0] + event.rel[0], last.rel[1] + event.rel[1])
+            event = pygame.event.Event(pygame.MOUSEMOTION, pos=event.pos, rel=rel, buttons=event.buttons)
+        elif event.type == pygame.JOYBALLMOTION:
+            rel = (last.rel[0] + event.rel[0], last.rel[1] + event.rel[1])
+            event = pygame.event.Event(pygame.JOYBALLMOTION, joy=event.joy, ball=event.ball, rel=rel)
+        result[index] = event
+    return result
 
+def _WaitEvent(timeout):
+    try:
+        return pygame.event.wait(timeout)
+    except TypeError:
+        # Older pygame versions can't wait with a timeout, so just sleep instead.
+        pygame.time.wait(timeout)
+        return None
 
+def pollEmitter(timeout=0):
+    """
+    Emits all pending pygame events, then flushes batch listeners, and returns how many events and batches were handled.
+    If timeout (in milliseconds) is greater than zero and no events are pending, blocks for up to that long waiting for one.
+    """
+    events = []
+    if timeout > 0 and not pygame.event.peek():
+        event = _WaitEvent(timeout)
+        if event is not None and event.type != pygame.NOEVENT:
+            events.append(event)
+    events.extend(pygame.event.get())
+    if Events.coalesce and len(events) > 1:
+        events = _Coalesce(events)
+    for event in events:
+        _EmitEvent(event)
+    return len(events) + Events._FlushBatches()
@@ -7,7 +7,8 @@
 
 from .display import Display
 from .events import Events
-from .resource import ResourceManager
+from .resource import ResourceManager, ResourceError
+from .text import TextCache
 import pygame
 
 
@@ -15,15 +16,31 @@ class NodeError(Exception):
     pass
 
 
+# Bumped whenever a node is attached or removed anywhere, so caches of what a tree contains know to rebuild.
+_TREE_VERSION = 0
+
+
 class Node:
+    __slots__ = (
+        "__weakref__",
+        "_NODE_parent", "_NODE_name", "_NODE_children", "_NODE_index", "_NODE_tags", "_NODE_tagged",
+        "_NODE_resource", "_NODE_position", "_NODE_world", "_NODE_root", "_NODE_full_name"
+    )
+
     def __init__(self, name="Node", parent=None):
-        self._NODE_DATA={
-            "parent":None,
-            "name":name,
-            "children":[],
-            "resource":None,
-            "position":(0,0)
-        }
+        self._NODE_parent = None
+        self._NODE_name = name
+        # Containers are created when first needed. Most nodes are leaves without tags.
+        self._NODE_children = ()
+        self._NODE_index = None # child name -> child
+        self._NODE_tags = None
+        self._NODE_tagged = None # tag -> {node:None} for the whole tree. Only kept on the root.
+        self._NODE_resource = None
+        self._NODE_position = (0,0)
+        # Cached values derived from the parent chain. None until asked for.
+        self._NODE_world = None
+        self._NODE_root = None
+        self._NODE_full_name = None
         if parent is not None:
             try:
                 self.parent = parent
@@ -32,7 +49,7 @@ class Node:
 
     @property
     def parent(self):
-        return self._NODE_DATA["parent"]
+        return self._NODE_parent
 
     @parent.setter
     def parent(self, new_parent):
@@ -43,42 +60,61 @@ class Node:
 
     @property
     def root(self):
-        if self.parent is None:
-            return self
-        return self.parent.root
+        r = self._NODE_root
+        if r is None:
+            p = self.parent
+            r = self if p is None else p.root
+            self._NODE_root = r
+        return r
 
     @property
     def name(self):
-        return self._NODE_DATA["name"]
+        return self._NODE_name
 
     @name.setter
     def name(self, value):
-        if self.parent is not None:
-            if self.parent.get_node(value) is not None:
-                raise NodeError("Parent already contains node named '{}'.".format(name))
-        self._NODE_DATA["name"] = value
+        if value == self._NODE_name:
+            return
+        p = self.parent
+        if p is not None:
+            index = p._NODE_index
+            if value in index:
+                raise NodeError("Parent already contains node named '{}'.".format(value))
+            del index[self._NODE_name]
+            index[value] = self
+        self._NODE_name = value
+        self._markHierarchyDirty()
 
     @property
     def full_name(self):
-        if self.parent is None:
-            return self.name
-        return self.parent.full_name + "." + self.name
+        fn = self._NODE_full_name
+        if fn is None:
+            p = self.parent
+            fn = self.name if p is None else p.full_name + "." + self.name
+            self._NODE_full_name = fn
+        return fn
 
     @property
     def resource(self):
-        if self._NODE_DATA["resource"] is None:
+        if self._NODE_resource is None:
             # Only bother creating the instance if it's being asked for.
             # All ResourceManager instances access same data.
-            self._NODE_DATA["resource"] = ResourceManager()
-        return self._NODE_DATA["resource"]
+            self._NODE_resource = ResourceManager()
+        return self._NODE_resource
 
     @property
     def child_count(self):
-        return len(self._NODE_DATA["children"])
+        return len(self._NODE_children)
+
+    @property
+    def tags(self):
+        if self._NODE_tags is None:
+            return ()
+        return tuple(self._NODE_tags)
 
     @property
     def position(self):
-        p = self._NODE_DATA["position"]
+        p = self._NODE_position
         return (p[0], p[1])
     @position.setter
     def position(self, pos):
@@ -94,36 +130,51 @@ class Node:
 
     @property
     def position_x(self):
-        return self._NODE_DATA["position"][0]
+        return self._NODE_position[0]
     @position_x.setter
     def position_x(self, v):
         if not isinstance(v, (int, float)):
             raise TypeError("Excepted an number value.")
-        self._NODE_DATA["position"] = (float(v), self._NODE_DATA["position"][1])
+        if float(v) == self._NODE_position[0]:
+            return
+        self._markBoundsDirty()
+        self._NODE_position = (float(v), self._NODE_position[1])
+        self._markWorldDirty()
+        self._markBoundsDirty()
 
     @property
     def position_y(self):
-        return self._NODE_DATA["position"][1]
+        return self._NODE_position[1]
     @position_y.setter
     def position_y(self, v):
         if not isinstance(v, (int, float)):
             raise TypeError("Excepted an number value.")
-        self._NODE_DATA["position"] = (self._NODE_DATA["position"][0], float(v))
+        if float(v) == self._NODE_position[1]:
+            return
+        self._markBoundsDirty()
+        self._NODE_position = (self._NODE_position[0], float(v))
+        self._markWorldDirty()
+        self._markBoundsDirty()
 
 
     def get_world_position(self):
-        if self.parent is None:
-            return (0,0)
-        pos = self.position
-        ppos = self.parent.get_world_position()
-        return (pos[0] + ppos[0], pos[1] + ppos[1])
+        wpos = self._NODE_world
+        if wpos is None:
+            if self.parent is None:
+                wpos = (0,0)
+            else:
+                pos = self._NODE_position
+                ppos = self.parent.get_world_position()
+                wpos = (pos[0] + ppos[0], pos[1] + ppos[1])
+            self._NODE_world = wpos
+        return wpos
 
     def parent_to_node(self, parent, allow_reparenting=False):
         if not isinstance(parent, Node):
             raise NodeError("Node may only parent to another Node instance.")
         if self.parent is None or self.parent != parent:
             if self.parent is not None:
-                if allow_Reparenting == False:
+                if allow_reparenting == False:
                     raise NodeError("Node already assigned a parent Node.")
                 if self.parent.remove_node(self) != self:
                     raise NodeError("Failed to remove self from current parent.")
@@ -134,6 +185,7 @@ class Node:
 
 
     def attach_node(self, node, reparent=False, index=-1):
+        global _TREE_VERSION
         if node.parent is not None:
             if node.parent == self:
                 return # Nothing to do. Given node already parented to this node.
@@ -141,17 +193,33 @@ class Node:
                 raise NodeError("Node already parented.")
             if node.parent.remove_node(node) != node:
                 raise NodeError("Failed to remove given node from it's current parent.")
-        if self.get_node(node.name) is not None:
+        if self._NODE_index is None:
+            self._NODE_index = {}
+            self._NODE_children = []
+        elif node.name in self._NODE_index:
             raise NodeError("Node with name '{}' already attached.".format(node.name))
-        node._NODE_DATA["parent"] = self
-        children = self._NODE_DATA["children"]
+        node._NODE_parent = self
+        self._NODE_index[node.name] = node
+        children = self._NODE_children
         if index < 0 or index >= len(children):
             children.append(node)
         else:
             children.insert(index, node)
+        if node._NODE_tagged is not None:
+            # The node was the root of its own tree. Its tags now belong to this one.
+            root = self.root
+            if root._NODE_tagged is None:
+                root._NODE_tagged = {}
+            for tag, nodes in node._NODE_tagged.items():
+                root._NODE_tagged.setdefault(tag, {}).update(nodes)
+            node._NODE_tagged = None
+        node._markHierarchyDirty()
+        node.mark_dirty()
+        _TREE_VERSION += 1
 
     def remove_node(self, node):
-        if isinstance(node, (str, unicode)):
+        global _TREE_VERSION
+        if isinstance(node, str):
             n = self.get_node(node)
             if n is not None:
                 try:
@@ -166,9 +234,20 @@ class Node:
                     return node.parent.remove_node(node)
                 except NodeError as e:
                     raise e
-            if node in self._NODE_DATA["children"]:
-                self._NODE_DATA["children"].remove(node)
-                node._NODE_DATA["parent"] = None
+            if node in self._NODE_children:
+                node._markBoundsDirty()
+                tagged = self.root._NODE_tagged
+                self._NODE_children.remove(node)
+                del self._NODE_index[node.name]
+                node._NODE_parent = None
+                node._markHierarchyDirty()
+                _TREE_VERSION += 1
+                if tagged is not None:
+                    # The node is now the root of its own tree, so it takes the tags of its branch with it.
+                    branch = {}
+                    node._NODE_MoveTags(tagged, branch)
+                    if len(branch) > 0:
+                        node._NODE_tagged = branch
                 return node
         else:
             raise NodeError("Expected a Node instance or a string.")
@@ -176,20 +255,128 @@ class Node:
 
 
     def get_node(self, name):
-        if self.child_count <= 0:
+        """
+        Returns the descendant at the given dotted path of names, relative to this node, or None.
+        """
+        node = self
+        for subname in name.split("."):
+            if node._NODE_index is None:
+                return None
+            node = node._NODE_index.get(subname)
+            if node is None:
+                return None
+        return node
+
+    def find(self, path):
+        """
+        Returns the node at a path in the form given by full_name, starting from the root of this node's tree, or None.
+        """
+        root = self.root
+        names = path.split(".", 1)
+        if names[0] != root.name:
             return None
-
-        subnames = name.split(".")
-        for c in self._NODE_DATA["children"]:
-            if c.name == subnames[0]:
-                if len(subnames) > 1:
-                    return c.get_node(".".join(subnames[1:-1]))
-                return c
+        if len(names) == 1:
+            return root
+        return root.get_node(names[1])
+
+    def add_tag(self, tag):
+        if self._NODE_tags is None:
+            self._NODE_tags = set()
+        elif tag in self._NODE_tags:
+            return
+        self._NODE_tags.add(tag)
+        root = self.root
+        if root._NODE_tagged is None:
+            root._NODE_tagged = {}
+        root._NODE_tagged.setdefault(tag, {})[self] = None
+
+    def remove_tag(self, tag):
+        if self._NODE_tags is None or tag not in self._NODE_tags:
+            return
+        self._NODE_tags.discard(tag)
+        tagged = self.root._NODE_tagged
+        nodes = tagged[tag]
+        del nodes[self]
+        if len(nodes) <= 0:
+            del tagged[tag]
+
+    def has_tag(self, tag):
+        return self._NODE_tags is not None and tag in self._NODE_tags
+
+    def get_tagged_nodes(self, tag):
+        """
+        Returns a list of every node in this node's tree with the given tag.
+        """
+        tagged = self.root._NODE_tagged
+        if tagged is None or tag not in tagged:
+            return []
+        nodes = tagged[tag]
+        return list(nodes)
+
+    def _NODE_MoveTags(self, src, dst):
+        # Moves this branch's entries from one tree's tag index to another's.
+        if self._NODE_tags is not None:
+            for tag in self._NODE_tags:
+                nodes = src[tag]
+                del nodes[self]
+                if len(nodes) <= 0:
+                    del src[tag]
+                dst.setdefault(tag, {})[self] = None
+        for c in self._NODE_children:
+            c._NODE_MoveTags(src, dst)
+
+    def mark_dirty(self, rect=None):
+        """
+        Flags an area of the surface this node renders into as needing a redraw. Only used when
+        Display.damage_tracking is enabled. rect is in the coordinates of that surface, None flags all of it.
+        """
+        if not Display.damage_tracking:
+            return
+        p = self.parent
+        while p is not None:
+            if isinstance(p, NodeSurface):
+                p._addDamage(rect)
+                return
+            p = p.parent
+        Display.mark_dirty(rect)
+
+    def _getDirtyBounds(self):
+        # Unknown bounds. Nodes that know the area they draw to override this.
         return None
 
-    def listen(self, signal, callback_fn):
+    def _markBoundsDirty(self):
+        if not Display.damage_tracking:
+            return
+        if self.child_count > 0:
+            # Children move (or vanish) along with this node, so the whole surface needs redrawing.
+            self.mark_dirty()
+        else:
+            self.mark_dirty(self._getDirtyBounds())
+
+    def _markTreeDirty(self):
+        for c in self._NODE_children:
+            c._markTreeDirty()
+
+    def _markWorldDirty(self):
+        # A node's world position is only ever cached after its parent's, so if this one isn't cached, neither is
+        # anything below it.
+        if self._NODE_world is None:
+            return
+        self._NODE_world = None
+        for c in self._NODE_children:
+            c._markWorldDirty()
+
+    def _markHierarchyDirty(self):
+        # The parent chain changed. Drop every value derived from it, here and below.
+        self._NODE_world = None
+        self._NODE_root = None
+        self._NODE_full_name = None
+        for c in self._NODE_children:
+            c._markHierarchyDirty()
+
+    def listen(self, signal, callback_fn, batch=False):
         try:
-            Events.listen(signal, callback_fn)
+            Events.listen(signal, callback_fn, batch)
         except Exception as e:
             raise e
 
@@ -207,67 +394,97 @@ class Node:
     def _init(self):
         if hasattr(self, "on_init"):
             self.on_init()
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._init()
 
     def _close(self):
         if hasattr(self, "on_close"):
             self.on_close()
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._close()
 
     def _pause(self):
         if hasattr(self, "on_pause"):
             self.on_pause()
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._pause()
 
     def _start(self):
         if hasattr(self, "on_start"):
             self.on_start()
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._start()
 
+    def _needsUpdate(self):
+        if hasattr(self, "on_update"):
+            return True
+        for c in self._NODE_children:
+            if c._needsUpdate():
+                return True
+        return False
+
     def _update(self, dt):
         if hasattr(self, "on_update"):
             self.on_update(dt)
 
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._update(dt)
 
     def _render(self, surface):
-        for c in self._NODE_DATA["children"]:
+        for c in self._NODE_children:
             c._render(surface)
 
 
 
 
 class Node2D(Node):
+    __slots__ = ("_NODE2D_visible", "_NODE2D_resolution", "_ACTIVE_SURF")
+
     def __init__(self, name="Node2D", parent=None):
+        # Set before Node.__init__(), as attaching to the parent already touches it.
+        self._NODE2D_visible = True
+        self._NODE2D_resolution = False # Cached resolution. None = the Display's, False = not yet resolved.
         try:
             Node.__init__(self, name, parent)
         except NodeError as e:
             raise e
-        self._NODE2D_DATA = {
-            "visible":True
-        }
 
     @property
     def resolution(self):
-        p = self.parent
-        # We don't directly have the answer, but maybe our parent does?
-        if p is not None:
-            if hasattr(p, "resolution"):
-                return p.resolution
-        # Otherwise the Display object should.
-        return Display.resolution
+        res = self._NODE2D_InheritedResolution()
+        if res is None:
+            # Looked up every time, as the Display can be resized.
+            return Display.resolution
+        return res
+
+    def _NODE2D_InheritedResolution(self):
+        res = self._NODE2D_resolution
+        if res is False:
+            p = self.parent
+            # We don't directly have the answer, but maybe our parent does?
+            res = None
+            if isinstance(p, Node2D):
+                res = p._childResolution()
+            self._NODE2D_resolution = res
+        return res
+
+    def _childResolution(self):
+        # The resolution children of this node inherit. None if it's the Display's.
+        return self._NODE2D_InheritedResolution()
+
+    def _markHierarchyDirty(self):
+        self._NODE2D_resolution = False
+        Node._markHierarchyDirty(self)
 
     @property
     def visible(self):
-        return self._NODE2D_DATA["visible"]
+        return self._NODE2D_visible
     @visible.setter
     def visible(self, vis):
-        self._NODE2D_DATA["visible"] = (vis == True)
+        vis = (vis == True)
+        if vis != self._NODE2D_visible:
+            self._NODE2D_visible = vis
+            self._markBoundsDirty()
 
     def _callOnRender(self, surface):
         if hasattr(self, "on_render"):
@@ -276,7 +493,7 @@ class Node2D(Node):
             del self._ACTIVE_SURF
 
     def _render(self, surface):
-        if self._NODE2D_DATA["visible"] == True:
+        if self._NODE2D_visible == True:
             self._callOnRender(surface)
             Node._render(self, surface)
 
@@ -285,6 +502,14 @@ class Node2D(Node):
             return
         self._ACTIVE_SURF.blit(img, pos, rect)
 
+    def draw_images(self, blits):
+        """
+        Draws a sequence of (image, pos) or (image, pos, rect) tuples in a single batched call.
+        """
+        if not hasattr(self, "_ACTIVE_SURF"):
+            return
+        self._ACTIVE_SURF.blits(blits, False)
+
     def fill(self, color):
         if not hasattr(self, "_ACTIVE_SURF"):
             return
@@ -331,15 +556,18 @@ class Node2D(Node):
 
 
 class NodeSurface(Node2D):
+    __slots__ = (
+        "_NODESURFACE_clear_color", "_scale", "_scaleToDisplay", "_scaleDirty", "_keepAspectRatio", "_alignCenter",
+        "_surface", "_tsurface", "_tsurfaceStale", "_damage", "_damageAll", "_lastBlit"
+    )
+
     def __init__(self, name="NodeSurface", parent=None):
         try:
             Node2D.__init__(self, name, parent)
         except NodeError as e:
             raise e
-        # TODO: Update this class to use the _NODE*_DATA={} structure.
-        self._NODESURFACE_DATA={
-            "clear_color":None
-        }
+        # TODO: Update this class to use _NODESURFACE_ prefixed fields.
+        self._NODESURFACE_clear_color = None
         self._scale = (1.0, 1.0)
         self._scaleToDisplay = False
         self._scaleDirty = False
@@ -347,6 +575,10 @@ class NodeSurface(Node2D):
         self._alignCenter = False
         self._surface = None
         self._tsurface = None
+        self._tsurfaceStale = True
+        self._damage = [] # Rects of _surface needing a redraw when damage tracking.
+        self._damageAll = True
+        self._lastBlit = None # (dest rect, (x scale, y scale)) of the last _scale_and_blit()
         self.set_surface()
 
     def _updateTransformSurface(self):
@@ -354,6 +586,8 @@ class NodeSurface(Node2D):
             return
 
         self._scaleDirty = False
+        self._damageAll = True
+        self.mark_dirty()
         if self._scaleToDisplay:
             dsize = Display.resolution
             ssize = self._surface.get_size()
@@ -389,6 +623,11 @@ class NodeSurface(Node2D):
         except (TypeError, ValueError) as e:
             raise e
 
+    def _childResolution(self):
+        if self._surface is None:
+            return Node2D._childResolution(self)
+        return self._surface.get_size()
+
     @property
     def width(self):
         return self.resolution[0]
@@ -430,6 +669,7 @@ class NodeSurface(Node2D):
     @align_center.setter
     def align_center(self, center):
         self._alignCenter = (center == True)
+        self.mark_dirty()
 
     @property
     def scale_to_display(self):
@@ -458,6 +698,7 @@ class NodeSurface(Node2D):
                 self._surface = dsurf.convert_alpha()
                 self._surface.fill(pygame.Color(0,0,0,0))
                 self._updateTransformSurface()
+                self._NODESURFACE_ResolutionChanged()
         else:
             if not isinstance(resolution, tuple):
                 raise TypeError("Expected a tuple.")
@@ -471,10 +712,12 @@ class NodeSurface(Node2D):
                 self._surface = pygame.Surface(resolution, pygame.SRCALPHA)
             self._surface.fill(pygame.Color(0,0,0,0))
             self._updateTransformSurface()
+            self._NODESURFACE_ResolutionChanged()
 
     def set_clear_color(self, color):
         if color is None:
-            self._NODESURFACE_DATA["clear_color"] = None
+            self._NODESURFACE_clear_color = None
+            self._addDamage(None)
         elif isinstance(color, (list, tuple)):
             clen = len(color)
             if clen == 3 or clen == 4:
@@ -482,14 +725,47 @@ class NodeSurface(Node2D):
 
                 if iscolor(color[0]) and iscolor(color[1]) and iscolor(color[2]):
                     if clen == 3 or (clen == 4 and iscolor(color[3])):
-                        self._NODESURFACE_DATA["clear_color"] = pygame.Color(*color)
+                        self._NODESURFACE_clear_color = pygame.Color(*color)
+                        self._addDamage(None)
 
     def get_clear_color(self):
-        cc = self._NODESURFACE_DATA["clear_color"]
+        cc = self._NODESURFACE_clear_color
         if cc == None:
             return None
         return (cc.r, cc.g, cc.b, cc.a)
 
+    def _addDamage(self, rect):
+        if not Display.damage_tracking:
+            return
+        if rect is None:
+            self._damageAll = True
+        elif not self._damageAll:
+            self._damage.append(pygame.Rect(rect))
+        self.mark_dirty(self._damageToParent(rect))
+
+    def _damageToParent(self, rect):
+        # Maps a rect of this surface to the area it was last blitted to on the parent's surface.
+        if self._lastBlit is None:
+            return None
+        dest, scale = self._lastBlit
+        if rect is None:
+            return pygame.Rect(dest)
+        rect = pygame.Rect(rect)
+        return pygame.Rect(
+            dest[0] + int(rect.x * scale[0]),
+            dest[1] + int(rect.y * scale[1]),
+            int(rect.w * scale[0]) + 2,
+            int(rect.h * scale[1]) + 2
+        )
+
+    def _markTreeDirty(self):
+        self._damageAll = True
+        Node2D._markTreeDirty(self)
+
+    def _NODESURFACE_ResolutionChanged(self):
+        for c in self._NODE_children:
+            c._markHierarchyDirty()
+
     def _render(self, surface):
         if self.visible == False:
             return
@@ -499,10 +775,21 @@ class NodeSurface(Node2D):
         if self._surface is not None:
             if self._scaleDirty:
                 self._updateTransformSurface()
-            cc = self._NODESURFACE_DATA["clear_color"]
-            if cc is not None:
-                self._surface.fill(cc)
-            Node2D._render(self, self._surface)
+            clip = None
+            if Display.damage_tracking and not self._damageAll:
+                # Only redraw what changed. Everything else on the surface is still valid from the last frame.
+                if len(self._damage) > 0:
+                    clip = self._damage[0].unionall(self._damage[1:])
+            if clip is not None or self._damageAll or not Display.damage_tracking:
+                self._surface.set_clip(clip)
+                cc = self._NODESURFACE_clear_color
+                if cc is not None:
+                    self._surface.fill(cc)
+                Node2D._render(self, self._surface)
+                self._surface.set_clip(None)
+                self._tsurfaceStale = True
+            self._damage = []
+            self._damageAll = False
         else:
             Node2D._render(self, surface)
         self._scale_and_blit(surface)
@@ -513,7 +800,9 @@ class NodeSurface(Node2D):
 
         src = self._surface
         if self._tsurface is not None:
-            pygame.transform.scale(self._surface, self._tsurface.get_size(), self._tsurface)
+            if self._tsurfaceStale:
+                pygame.transform.scale(self._surface, self._tsurface.get_size(), self._tsurface)
+                self._tsurfaceStale = False
             src = self._tsurface
 
         ssize = src.get_size()
@@ -526,6 +815,9 @@ class NodeSurface(Node2D):
                 posy += (dsize[1] - ssize[1]) * 0.5
         pos = (int(posx), int(posy))
         dest.blit(src, pos)
+        ssize = src.get_size()
+        size = self._surface.get_size()
+        self._lastBlit = (pygame.Rect(pos, ssize), (ssize[0] / size[0], ssize[1] / size[1]))
 
     def _OnVideoResize(self, event, data):
         if self._scaleToDisplay:
@@ -533,64 +825,67 @@ class NodeSurface(Node2D):
 
 
 class NodeText(Node2D):
+    __slots__ = (
+        "_NODETEXT_font_src", "_NODETEXT_size", "_NODETEXT_antialias", "_NODETEXT_color", "_NODETEXT_background",
+        "_NODETEXT_text", "_NODETEXT_surface"
+    )
+
     def __init__(self, name="NodeText", parent=None):
         try:
             Node2D.__init__(self, name, parent)
         except NodeError as e:
             raise e
-        self._NODETEXT_DATA={
-            "font_src":"",
-            "size":26,
-            "antialias":True,
-            "color":pygame.Color(255,255,255),
-            "background":None,
-            "text":"Some Text",
-            "surface":None
-        }
+        self._NODETEXT_font_src = ""
+        self._NODETEXT_size = 26
+        self._NODETEXT_antialias = True
+        self._NODETEXT_color = pygame.Color(255,255,255)
+        self._NODETEXT_background = None
+        self._NODETEXT_text = "Some Text"
+        self._NODETEXT_surface = None
 
     @property
     def font_src(self):
-        return self._NODETEXT_DATA["font_src"]
+        return self._NODETEXT_font_src
     @font_src.setter
     def font_src(self, src):
         res = self.resource
-        if src != "" and src != self._NODETEXT_DATA["font_src"] and res.is_valid("font", src):
-            self._NODETEXT_DATA["font_src"] = src
+        if src != "" and src != self._NODETEXT_font_src and res.is_valid("font", src):
+            self._NODETEXT_font_src = src
             if not res.has("font", src):
                 res.store("font", src)
-            self._NODETEXT_DATA["surface"] = None
+            self._NODETEXT_Invalidate()
 
     @property
     def size(self):
-        return self._NODETEXT_DATA["size"]
+        return self._NODETEXT_size
     @size.setter
     def size(self, size):
         if not isinstance(size, int):
             raise TypeError("Expected integer value.")
         if size <= 0:
             raise ValueError("Size must be greater than zero.")
-        if size != self._NODETEXT_DATA["size"]:
-            self._NODETEXT_DATA["size"] = size
-            self._NODETEXT_DATA["surface"] = None
+        if size != self._NODETEXT_size:
+            self._NODETEXT_size = size
+            self._NODETEXT_Invalidate()
 
     @property
     def antialias(self):
-        return self._NODETEXT_DATA["antialias"]
+        return self._NODETEXT_antialias
     @antialias.setter
     def antialias(self, enable):
         enable = (enable == True)
-        if enable != self._NODETEXT_DATA["antialias"]:
-            self._NODETEXT_DATA["antialias"] = enable
-            self._NODETEXT_DATA["surface"] = None
+        if enable != self._NODETEXT_antialias:
+            self._NODETEXT_antialias = enable
+            self._NODETEXT_Invalidate()
 
     @property
     def text(self):
-        return self._NODETEXT_DATA["text"]
+        return self._NODETEXT_text
     @text.setter
     def text(self, text):
-        if text != self._NODETEXT_DATA["text"]:
-            self._NODETEXT_DATA["text"] = text
-            self._NODETEXT_DATA["surface"] = None
+        if text != self._NODETEXT_text:
+            self._NODETEXT_text = text
+            self._NODETEXT_Invalidate()
 
     def _setColor(self, cname, r, g, b, a):
         if r < 0 or r > 255:
@@ -601,16 +896,16 @@ class NodeText(Node2D):
             raise ValueError("Blue value out of bounds.")
         if a < 0 or a > 255:
             raise ValueError("Alpha value out of bounds.")
-        color = self._NODETEXT_DATA[cname]
+        color = getattr(self, "_NODETEXT_" + cname)
         if color is None or color.r != r or color.g != g or color.b != b or color.a != a:
-            self._NODETEXT_DATA[cname] = pygame.Color(r,g,b,a)
-            self._NODETEXT_DATA["surface"] = None
+            setattr(self, "_NODETEXT_" + cname, pygame.Color(r,g,b,a))
+            self._NODETEXT_Invalidate()
 
     def _getColor(self, cname):
-        if self._NODETEXT_DATA[cname] is None:
+        c = getattr(self, "_NODETEXT_" + cname)
+        if c is None:
             return (0,0,0,0)
         else:
-            c = self._NODETEXT_DATA[cname]
             return (c.r, c.g, c.b, c.a)
 
     def set_color(self, r, g, b, a=255):
@@ -631,9 +926,9 @@ class NodeText(Node2D):
         return self
 
     def clear_background(self):
-        if self._NODETEXT_DATA["background"] is not None:
-            self._NODETEXT_DATA["background"] = None
-            self._NODETEXT_DATA["surface"] = None
+        if self._NODETEXT_background is not None:
+            self._NODETEXT_background = None
+            self._NODETEXT_Invalidate()
         return self
 
     def get_background(self):
@@ -643,60 +938,69 @@ class NodeText(Node2D):
         return c
 
 
+    def _NODETEXT_Invalidate(self):
+        # The size of the new text isn't known until it's rendered, so the whole surface gets flagged.
+        self._NODETEXT_surface = None
+        self.mark_dirty()
+
+    def _getDirtyBounds(self):
+        surf = self._NODETEXT_surface
+        if surf is None:
+            return None
+        pos = self.get_world_position()
+        return pygame.Rect((int(pos[0]), int(pos[1])), surf.get_size())
+
     def _render(self, surface):
         if self.visible == False:
             return
 
-        if self._NODETEXT_DATA["surface"] is None and self._NODETEXT_DATA["text"] != "":
-            res = self.resource
-            fnt = res.get("font", self._NODETEXT_DATA["font_src"], {"size":self._NODETEXT_DATA["size"]})
-            if fnt is not None and fnt() is not None:
-                surf = None
-                try:
-                    text = self.text
-                    antialias = self.antialias
-                    color = self._NODETEXT_DATA["color"]
-                    background = self._NODETEXT_DATA["background"]
-                    surf = fnt().render(text, antialias, color, background)
-                except pygame.error as e:
-                    pass # TODO: Update to send out warning!
-                self._NODETEXT_DATA["surface"] = surf
-            # We really don't want to keep the font instance around... just in case we want to use the same font at different sizes.
-            res.clear("font", self._NODETEXT_DATA["font_src"])
+        if self._NODETEXT_surface is None and self._NODETEXT_text != "":
+            surf = None
+            try:
+                surf = TextCache.render(self._NODETEXT_font_src, self._NODETEXT_size, self._NODETEXT_text,
+                    self._NODETEXT_antialias, self._NODETEXT_color, self._NODETEXT_background)
+            except pygame.error as e:
+                pass # TODO: Update to send out warning!
+            self._NODETEXT_surface = surf
         Node2D._render(self, surface)
-        if self._NODETEXT_DATA["surface"] is not None:
+        if self._NODETEXT_surface is not None:
             pos = self.get_world_position()
             pos = (int(pos[0]), int(pos[1]))
-            surface.blit(self._NODETEXT_DATA["surface"], pos)
+            surface.blit(self._NODETEXT_surface, pos)
 
 
 
 class NodeSprite(Node2D):
+    __slots__ = (
+        "_NODESPRITE_rect", "_NODESPRITE_image", "_NODESPRITE_scale", "_NODESPRITE_scale_dirty",
+        "_NODESPRITE_surface", "_NODESPRITE_frame", "_NODESPRITE_whole"
+    )
+
     def __init__(self, name="NodeSprite", parent=None):
         try:
             Node2D.__init__(self, name, parent)
         except NodeError as e:
             raise e
-        self._NODESPRITE_DATA={
-            "rect":[0,0,0,0],
-            "image":"",
-            "scale":[1.0, 1.0],
-            "scale_dirty":True,
-            "surface":None
-        }
+        self._NODESPRITE_rect = [0,0,0,0]
+        self._NODESPRITE_image = ""
+        self._NODESPRITE_scale = [1.0, 1.0]
+        self._NODESPRITE_scale_dirty = True
+        self._NODESPRITE_surface = None
+        self._NODESPRITE_frame = None
+        self._NODESPRITE_whole = False
 
     @property
     def image_width(self):
-        if self._NODESPRITE_DATA["surface"] is None:
+        surf = self._NODESPRITE_Surface()
+        if surf is None:
             return 0
-        surf = self._NODESPRITE_DATA["surface"]()
         return surf.get_width()
 
     @property
     def image_height(self):
-        if self._NODESPRITE_DATA["surface"] is None:
+        surf = self._NODESPRITE_Surface()
+        if surf is None:
             return 0
-        surf = self._NODESPRITE_DATA["surface"]()
         return surf.get_height()
 
     @property
@@ -709,10 +1013,10 @@ class NodeSprite(Node2D):
 
     @property
     def rect(self):
-        return (self._NODESPRITE_DATA["rect"][0],
-            self._NODESPRITE_DATA["rect"][1],
-            self._NODESPRITE_DATA["rect"][2],
-            self._NODESPRITE_DATA["rect"][3])
+        return (self._NODESPRITE_rect[0],
+            self._NODESPRITE_rect[1],
+            self._NODESPRITE_rect[2],
+            self._NODESPRITE_rect[3])
 
     @rect.setter
     def rect(self, rect):
@@ -730,54 +1034,62 @@ class NodeSprite(Node2D):
 
     @property
     def rect_x(self):
-        return self._NODESPRITE_DATA["rect"][0]
+        return self._NODESPRITE_rect[0]
     @rect_x.setter
     def rect_x(self, v):
         if not isinstance(v, int):
             raise TypeError("Expected integer value.")
-        self._NODESPRITE_DATA["rect"][0] = v
+        self._markBoundsDirty()
+        self._NODESPRITE_rect[0] = v
         self._NODESPRITE_ValidateRect()
+        self._markBoundsDirty()
 
     @property
     def rect_y(self):
-        return self._NODESPRITE_DATA["rect"][1]
+        return self._NODESPRITE_rect[1]
     @rect_y.setter
     def rect_y(self, v):
         if not isinstance(v, int):
             raise TypeError("Expected integer value.")
-        self._NODESPRITE_DATA["rect"][1] = v
+        self._markBoundsDirty()
+        self._NODESPRITE_rect[1] = v
         self._NODESPRITE_ValidateRect()
+        self._markBoundsDirty()
 
 
     @property
     def rect_width(self):
-        return self._NODESPRITE_DATA["rect"][2]
+        return self._NODESPRITE_rect[2]
     @rect_width.setter
     def rect_width(self, v):
         if not isinstance(v, int):
             raise TypeError("Expected integer value.")
-        self._NODESPRITE_DATA["rect"][2] = v
+        self._markBoundsDirty()
+        self._NODESPRITE_rect[2] = v
         self._NODESPRITE_ValidateRect()
+        self._markBoundsDirty()
 
 
     @property
     def rect_height(self):
-        return self._NODESPRITE_DATA["rect"][3]
+        return self._NODESPRITE_rect[3]
     @rect_height.setter
     def rect_height(self, v):
         if not isinstance(v, int):
             raise TypeError("Expected integer value.")
-        self._NODESPRITE_DATA["rect"][3] = v
+        self._markBoundsDirty()
+        self._NODESPRITE_rect[3] = v
         self._NODESPRITE_ValidateRect()
+        self._markBoundsDirty()
 
     @property
     def center(self):
-        r = self._NODESPRITE_DATA["rect"]
+        r = self._NODESPRITE_rect
         return (int(r[0] + (r[2] * 0.5)), int(r[1] + (r[3] * 0.5)))
 
     @property
     def scale(self):
-        return (self._NODESPRITE_DATA["scale"][0], self._NODESPRITE_DATA["scale"][1])
+        return (self._NODESPRITE_scale[0], self._NODESPRITE_scale[1])
     @scale.setter
     def scale(self, scale):
         if not isinstance(scale, (list, tuple)):
@@ -792,54 +1104,65 @@ class NodeSprite(Node2D):
 
     @property
     def scale_x(self):
-        return self._NODESPRITE_DATA["scale"][0]
+        return self._NODESPRITE_scale[0]
     @scale_x.setter
     def scale_x(self, v):
         if not isinstance(v, (int, float)):
             raise TypeError("Expected number value.")
-        self._NODESPRITE_DATA["scale"][0] = float(v)
-        self._NODESPRITE_DATA["scale_dirty"] = True
+        self._markBoundsDirty()
+        self._NODESPRITE_scale[0] = float(v)
+        self._NODESPRITE_scale_dirty = True
+        self._markBoundsDirty()
 
     @property
     def scale_y(self):
-        return self._NODESPRITE_DATA["scale"][1]
+        return self._NODESPRITE_scale[1]
     @scale_y.setter
     def scale_y(self, v):
         if not isinstance(v, (int, float)):
             raise TypeError("Expected number value.")
-        self._NODESPRITE_DATA["scale"][1] = float(v)
-        self._NODESPRITE_DATA["scale_dirty"] = True
+        self._markBoundsDirty()
+        self._NODESPRITE_scale[1] = float(v)
+        self._NODESPRITE_scale_dirty = True
+        self._markBoundsDirty()
 
     @property
     def image(self):
-        return self._NODESPRITE_DATA["image"]
+        return self._NODESPRITE_image
     @image.setter
     def image(self, src):
         src = src.strip()
-        if self._NODESPRITE_DATA["image"] == src:
+        if self._NODESPRITE_image == src:
             return # Nothing to change... lol
-        if self._NODESPRITE_DATA["image"] != "":
-            self._NODESPRITE_DATA["surface"] = None # Clear reference to original surface.
+        self._markBoundsDirty()
+        if self._NODESPRITE_image != "":
+            self._NODESPRITE_surface = None # Clear reference to original surface.
         if src != "":
             rm = self.resource
             try:
                 if not rm.has("graphic", src):
                     rm.store("graphic", src)
-                self._NODESPRITE_DATA["image"] = src
-                self._NODESPRITE_DATA["surface"] = rm.get("graphic", src)
-                if self._NODESPRITE_DATA["surface"] is None:
-                    self._NODESPRITE_DATA["image"] = ""
-                    self._NODESPRITE_DATA["rect"]=[0,0,0,0]
+                self._NODESPRITE_image = src
+                self._NODESPRITE_surface = rm.get("graphic", src)
+                if self._NODESPRITE_surface is None:
+                    self._NODESPRITE_image = ""
+                    self._NODESPRITE_rect=[0,0,0,0]
                 else:
                     # Resetting the rect to identity for the new image.
-                    surf = self._NODESPRITE_DATA["surface"]()
+                    surf = self._NODESPRITE_surface()
                     size = surf.get_size()
-                    self._NODESPRITE_DATA["rect"]=[0,0,size[0], size[1]]
+                    self._NODESPRITE_rect=[0,0,size[0], size[1]]
             except Exception as e:
                 raise e
         else:
-            self._NODESPRITE_DATA["image"] = ""
-            self._NODESPRITE_DATA["rect"]=[0,0,0,0]
+            self._NODESPRITE_image = ""
+            self._NODESPRITE_rect=[0,0,0,0]
+        self._NODESPRITE_scale_dirty = True
+        self._markBoundsDirty()
+
+    def _getDirtyBounds(self):
+        pos = self.get_world_position()
+        return pygame.Rect(int(pos[0]), int(pos[1]), self.sprite_width + 1, self.sprite_height + 1)
 
     def _render(self, surface):
         if self.visible == False:
@@ -848,75 +1171,68 @@ class NodeSprite(Node2D):
         # Call the on_render() method, if any
         Node2D._callOnRender(self, surface)
         
-        # Paint the sprite onto the surface
-        if self._NODESPRITE_DATA["surface"] is not None:
-            rect = self._NODESPRITE_DATA["rect"]
-            scale = self._NODESPRITE_DATA["scale"]
-            surf = self._NODESPRITE_DATA["surface"]()
-            # Of course, only bother if we have a surface to work with.
-            if surf is not None:
-                # Do some prescaling work, if needed.
-                if self._NODESPRITE_DATA["scale_dirty"]:
-                    self._NODESPRITE_DATA["scale_dirty"] = False
-                    self._NODESPRITE_UpdateFrameSurface(surf)
-                    self._NODESPRITE_UpdateScaleSurface(scale, surf)
-                fsurf = surf # Initial assumption that the surface is also the "frame"
-                # If we have a "frame" surface, however, let's get it and blit the rect into the frame surface.
-                if "frame_surf" in self._NODESPRITE_DATA:
-                    fsurf = self._NODESPRITE_DATA["frame_surf"]
-                    fsurf.blit(surf, (0, 0), rect) 
-                # If scaling, then transform (scale) the frame surface into the scale surface and set the frame surface to the scale surface. 
-                if "scale_surf" in self._NODESPRITE_DATA:
-                    ssurf = self._NODESPRITE_DATA["scale_surf"]
-                    pygame.transform.scale(fsurf, ssurf.get_size(), ssurf)
-                    fsurf = ssurf
-
-                # Place the sprite! WHEEEEE!
-                pos = self.get_world_position()
-                surface.blit(fsurf, pos)
+        # Place the sprite! WHEEEEE!
+        fsurf = self._NODESPRITE_Frame()
+        if fsurf is not None:
+            surface.blit(fsurf, self.get_world_position())
 
         # Call on all children
         Node._render(self, surface)
 
-    def _NODESPRITE_UpdateFrameSurface(self, surf):
-        rect = self.rect
-        ssize = surf.get_size()
-        if rect[2] == ssize[0] and rect[3] == ssize[1]:
-            if "frame_surf" in self._NODESPRITE_DATA:
-                del self._NODESPRITE_DATA
-            return
-
-        if "frame_surf" not in self._NODESPRITE_DATA:
-            self._NODESPRITE_DATA["frame_surf"] = pygame.Surface((rect[2], rect[3]), pygame.SRCALPHA, surf)
-        else:
-            fsurf = self._NODESPRITE_DATA["frame_surf"]
-            fsize = fsurf.get_size()
-            if fsize[0] != rect[2] or fsize[1] != rect[3]:
-                self._NODESPRITE_DATA["frame_surf"] = pygame.Surface((rect[2], rect[3]), pygame.SRCALPHA, surf)
-
-
-    def _NODESPRITE_UpdateScaleSurface(self, scale, surf):
-        ssurf = None
-        if "scale_surf" in self._NODESPRITE_DATA:
-            ssurf = self._NODESPRITE_DATA["scale_surf"]
-
-        if scale[0] == 1.0 and scale[1] == 1.0:
-            if ssurf is not None:
-                del self._NODESPRITE_DATA["scale_surf"]
-            return
-        nw = int(self.rect_width * scale[0])
-        nh = int(self.rect_height * scale[1])
-
-        if nw != ssurf.get_width() or nh != ssurf.get_height():
-            ssurf = pygame.Surface((nw, nh), pygame.SRCALPHA, surf)
-            ssurf.fill(pygame.Color(0,0,0,0))
-            self._NODESPRITE_DATA["scale_surf"] = ssurf
+    def _NODESPRITE_Surface(self):
+        """
+        Returns the image surface, fetching it from the resource manager again if it was evicted.
+        """
+        ref = self._NODESPRITE_surface
+        if ref is None:
+            return None
+        surf = ref()
+        if surf is None and self._NODESPRITE_image != "":
+            try:
+                ref = self.resource.get("graphic", self._NODESPRITE_image)
+            except ResourceError:
+                ref = None
+            self._NODESPRITE_surface = ref
+            self._NODESPRITE_scale_dirty = True
+            if ref is not None:
+                surf = ref()
+        return surf
+
+    def _NODESPRITE_Frame(self):
+        """
+        Returns the surface to draw for this sprite: the rect of the image, scaled. The result is cached until the
+        rect, scale or image changes. When the whole image is drawn unscaled the image itself is returned, so
+        no copy of it is held.
+        """
+        surf = self._NODESPRITE_Surface()
+        if surf is None:
+            self._NODESPRITE_frame = None
+            return None
+        if self._NODESPRITE_scale_dirty:
+            self._NODESPRITE_scale_dirty = False
+            rect = self._NODESPRITE_rect
+            scale = self._NODESPRITE_scale
+            size = (int(rect[2] * scale[0]), int(rect[3] * scale[1]))
+            scaled = scale[0] != 1.0 or scale[1] != 1.0
+            whole = (rect[2], rect[3]) == surf.get_size() and not scaled
+            frame = None
+            if size[0] > 0 and size[1] > 0 and not whole:
+                frame = surf.subsurface(rect)
+                if scaled:
+                    frame = pygame.transform.scale(frame, size)
+                else:
+                    frame = frame.copy() # Don't let the subsurface keep the image alive.
+            self._NODESPRITE_frame = frame
+            self._NODESPRITE_whole = whole
+        if self._NODESPRITE_whole:
+            return surf
+        return self._NODESPRITE_frame
 
     def _NODESPRITE_ValidateRect(self):
-        if self._NODESPRITE_DATA["surface"] is None:
-            self._NODESPRITE_DATA["rect"] = [0,0,0,0]
+        if self._NODESPRITE_surface is None:
+            self._NODESPRITE_rect = [0,0,0,0]
         else:
-            rect = self._NODESPRITE_DATA["rect"]
+            rect = self._NODESPRITE_rect
             isize = (self.image_width, self.image_height)
             if rect[0] < 0:
                 rect[2] += rect[0]
@@ -939,8 +1255,56 @@ class NodeSprite(Node2D):
             elif rect[1] + rect[3] > isize[1]:
                 rect[3] = isize[1] - rect[1]
 
-            self._NODESPRITE_DATA["scale_dirty"] = True
+            self._NODESPRITE_scale_dirty = True
 
 
 
+class NodeSpriteBatch(Node2D):
+    """
+    Container that draws its NodeSprite children with a single Surface.blits() call.
+    Sprites with children of their own, an on_render() method, or a subclass's own _render(), are drawn the usual
+    way, in their place in the child order, so the draw order never changes.
+    """
+    __slots__ = ("_NODESPRITEBATCH_batched",)
+
+    def __init__(self, name="NodeSpriteBatch", parent=None):
+        try:
+            Node2D.__init__(self, name, parent)
+        except NodeError as e:
+            raise e
+        self._NODESPRITEBATCH_batched = 0
 
+    @property
+    def batched_count(self):
+        """
+        The number of sprites drawn in batches during the last render.
+        """
+        return self._NODESPRITEBATCH_batched
+
+    def _render(self, surface):
+        if self.visible == False:
+            return
+
+        Node2D._callOnRender(self, surface)
+
+        # Every batched sprite is a direct child, so the world position is only needed once.
+        wpos = self.get_world_position()
+        batched = 0
+        blits = []
+        for c in self._NODE_children:
+            if type(c)._render is NodeSprite._render and c.child_count <= 0 and not hasattr(c, "on_render"):
+                if c.visible == False:
+                    continue
+                fsurf = c._NODESPRITE_Frame()
+                if fsurf is not None:
+                    pos = c.position
+                    blits.append((fsurf, (wpos[0] + pos[0], wpos[1] + pos[1])))
+                    batched += 1
+            else:
+                if len(blits) > 0:
+                    surface.blits(blits, False)
+                    blits = []
+                c._render(surface)
+        if len(blits) > 0:
+            surface.blits(blits, False)
+        self._NODESPRITEBATCH_batched = batched
@@ -0,0 +1,287 @@
+import time
+import csv
+import json
+import functools
+from collections import deque
+from . import events
+from .display import Display, _Display
+from .nodes import NodeError, Node, Node2D, NodeSurface, NodeText
+
+
+def _NodeClasses():
+    classes = []
+    pending = [Node]
+    while len(pending) > 0:
+        c = pending.pop()
+        if c not in classes:
+            classes.append(c)
+            pending.extend(c.__subclasses__())
+    return classes
+
+
+class _Profiler:
+    """
+    Opt-in frame profiler.
+    When enabled, Node._update, Node._render, NodeSurface._scale_and_blit, events.pollEmitter and Display.flip are
+    wrapped with timers. A frame ends on every Display.flip() and its timings, per phase and per node, are pushed
+    into a ring buffer. Node timings are inclusive of the node's children.
+    """
+    def __init__(self, capacity=600):
+        self._frames = deque(maxlen=capacity)
+        self._frame = None
+        self._frameCount = 0
+        self._frameStart = 0
+        self._depth = {}
+        self._active = set()
+        self._patched = []
+        self._overlay = None
+        self._trace = None
+
+    @property
+    def enabled(self):
+        return len(self._patched) > 0
+
+    @property
+    def capacity(self):
+        return self._frames.maxlen
+    @capacity.setter
+    def capacity(self, capacity):
+        if not isinstance(capacity, int):
+            raise TypeError("Expected integer value.")
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than zero.")
+        self._frames = deque(self._frames, maxlen=capacity)
+
+    @property
+    def frames(self):
+        return list(self._frames)
+
+    @property
+    def overlay(self):
+        return self._overlay
+    @overlay.setter
+    def overlay(self, node):
+        if node is not None and not isinstance(node, NodeProfilerOverlay):
+            raise TypeError("Expected a NodeProfilerOverlay instance.")
+        self._overlay = node
+        Display.mark_dirty()
+
+    def enable(self):
+        if self.enabled:
+            return
+        for c in _NodeClasses():
+            if "_update" in c.__dict__:
+                self._patch(c, "_update", self._timed("update", c.__dict__["_update"], True))
+            if "_render" in c.__dict__:
+                self._patch(c, "_render", self._timed("render", c.__dict__["_render"], True))
+        self._patch(NodeSurface, "_scale_and_blit", self._timed("scale_blit", NodeSurface._scale_and_blit, True))
+        self._patch(events, "pollEmitter", self._timed("events", events.pollEmitter, False))
+        self._patch(_Display, "flip", self._flipper(_Display.flip))
+        self._newFrame()
+
+    def disable(self):
+        for owner, attr, original in reversed(self._patched):
+            setattr(owner, attr, original)
+        self._patched = []
+        self._depth = {}
+        self._active = set()
+        self._frame = None
+
+    def clear(self):
+        self._frames.clear()
+        self._frameCount = 0
+        self._newFrame()
+
+    def trace_to(self, filename):
+        """
+        Streams every finished frame to the given CSV file until stop_trace() is called.
+        """
+        self.stop_trace()
+        f = open(filename, "w", newline="")
+        writer = csv.writer(f)
+        writer.writerow(["frame", "phase", "node", "ms"])
+        self._trace = (f, writer)
+
+    def stop_trace(self):
+        if self._trace is not None:
+            self._trace[0].close()
+            self._trace = None
+
+    def dump(self, filename):
+        """
+        Writes the frames currently in the ring buffer to filename. Files ending in .json are written as JSON,
+        anything else as CSV.
+        """
+        if filename.lower().endswith(".json"):
+            with open(filename, "w") as f:
+                json.dump(list(self._frames), f, indent=4)
+        else:
+            with open(filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "phase", "node", "ms"])
+                for frame in self._frames:
+                    self._writeFrame(writer, frame)
+
+    def summary(self):
+        """
+        Returns average timings, in milliseconds, over the frames in the ring buffer.
+        """
+        count = len(self._frames)
+        if count <= 0:
+            return {"frames":0, "fps":0.0, "frame_ms":0.0, "phases":{}, "nodes":[]}
+        duration = 0.0
+        phases = {}
+        nodes = {}
+        for frame in self._frames:
+            duration += frame["duration"]
+            for phase, t in frame["phases"].items():
+                phases[phase] = phases.get(phase, 0.0) + t
+            for phase, named in frame["nodes"].items():
+                for name, t in named.items():
+                    key = (phase, name)
+                    nodes[key] = nodes.get(key, 0.0) + t
+        ms = lambda t: (t / count) * 1000.0
+        return {
+            "frames":count,
+            "fps":(count / duration) if duration > 0 else 0.0,
+            "frame_ms":ms(duration),
+            "phases":{phase:ms(t) for phase, t in phases.items()},
+            "nodes":sorted([(key[0], key[1], ms(t)) for key, t in nodes.items()], key=lambda n: n[2], reverse=True)
+        }
+
+    def _patch(self, owner, attr, fn):
+        self._patched.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, fn)
+
+    def _timed(self, phase, fn, named):
+        prof = self
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (phase, id(args[0])) if named else None
+            if key is not None and key in prof._active:
+                # A subclass calling up into its base class' method. The node is already being timed.
+                return fn(*args, **kwargs)
+            depth = prof._depth.get(phase, 0)
+            prof._depth[phase] = depth + 1
+            if key is not None:
+                prof._active.add(key)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter_ns() - start) / 1000000000.0
+                prof._depth[phase] = depth
+                if key is not None:
+                    prof._active.discard(key)
+                prof._record(phase, args[0].full_name if named else None, elapsed, depth == 0)
+        return wrapper
+
+    def _flipper(self, fn):
+        prof = self
+        @functools.wraps(fn)
+        def wrapper(display, *args, **kwargs):
+            if prof._overlay is not None and display.surface is not None:
+                prof._overlay.refresh()
+                prof._overlay._render(display.surface)
+            start = time.perf_counter_ns()
+            try:
+                return fn(display, *args, **kwargs)
+            finally:
+                prof._record("flip", None, (time.perf_counter_ns() - start) / 1000000000.0, True)
+                prof._endFrame()
+        return wrapper
+
+    def _record(self, phase, name, elapsed, outermost):
+        frame = self._frame
+        if frame is None:
+            return
+        if outermost:
+            # Only the outermost call of a phase counts toward the phase total, nested calls are already inside it.
+            frame["phases"][phase] = frame["phases"].get(phase, 0.0) + elapsed
+        if name is not None:
+            named = frame["nodes"].setdefault(phase, {})
+            named[name] = named.get(name, 0.0) + elapsed
+
+    def _newFrame(self):
+        self._frameStart = time.perf_counter_ns()
+        self._frame = {"frame":self._frameCount, "duration":0.0, "phases":{}, "nodes":{}}
+
+    def _endFrame(self):
+        frame = self._frame
+        if frame is None:
+            return
+        frame["duration"] = (time.perf_counter_ns() - self._frameStart) / 1000000000.0
+        self._frames.append(frame)
+        if self._trace is not None:
+            self._writeFrame(self._trace[1], frame)
+        self._frameCount += 1
+        self._newFrame()
+
+    def _writeFrame(self, writer, frame):
+        writer.writerow([frame["frame"], "frame", "", frame["duration"] * 1000.0])
+        for phase, t in frame["phases"].items():
+            writer.writerow([frame["frame"], phase, "", t * 1000.0])
+        for phase, named in frame["nodes"].items():
+            for name, t in named.items():
+                writer.writerow([frame["frame"], phase, name, t * 1000.0])
+
+# The one and only profiler.
+Profiler = _Profiler()
+
+
+
+_PHASE_LABELS = {"events":"EVT", "update":"UPD", "render":"RND", "scale_blit":"BLIT", "flip":"FLIP"}
+
+class NodeProfilerOverlay(Node2D):
+    """
+    Shows the Profiler's running averages as lines of text.
+    Assign an instance to Profiler.overlay to have it drawn over everything else just before each Display.flip().
+    """
+    def __init__(self, name="ProfilerOverlay", parent=None, font_src="", size=8, lines=8):
+        try:
+            Node2D.__init__(self, name, parent)
+        except NodeError as e:
+            raise e
+        self._refreshRate = 500 # Milliseconds
+        self._lastRefresh = 0
+        self._lines = []
+        for i in range(0, lines):
+            line = NodeText("Line{}".format(i), self)
+            line.font_src = font_src
+            line.size = size
+            line.antialias = False
+            line.set_color(255, 255, 0)
+            line.set_background(0, 0, 0, 160)
+            line.position = (0, i * (size + 1))
+            line.text = ""
+            self._lines.append(line)
+
+    @property
+    def refresh_rate(self):
+        return self._refreshRate
+    @refresh_rate.setter
+    def refresh_rate(self, rate):
+        if not isinstance(rate, int):
+            raise TypeError("Expected integer value.")
+        if rate < 0:
+            raise ValueError("Refresh rate cannot be negative.")
+        self._refreshRate = rate
+
+    def refresh(self, force=False):
+        tick = time.perf_counter_ns() // 1000000
+        if not force and tick - self._lastRefresh < self._refreshRate:
+            return
+        self._lastRefresh = tick
+        s = Profiler.summary()
+        p = s["phases"]
+        text = [
+            "FPS {:.1f}  FRAME {:.2f}ms".format(s["fps"], s["frame_ms"]),
+            "EVT {:.2f} UPD {:.2f} RND {:.2f}".format(p.get("events", 0.0), p.get("update", 0.0), p.get("render", 0.0)),
+            "BLIT {:.2f} FLIP {:.2f}".format(p.get("scale_blit", 0.0), p.get("flip", 0.0))
+        ]
+        for phase, name, t in s["nodes"]:
+            if len(text) >= len(self._lines):
+                break
+            text.append("{} {} {:.2f}".format(_PHASE_LABELS.get(phase, phase), name, t))
+        for i in range(0, len(self._lines)):
+            self._lines[i].text = text[i] if i < len(text) else ""
@@ -0,0 +1,157 @@
+import marshal
+import random
+import struct
+import time
+from . import events
+
+
+# Log layout (little endian):
+#   header: magic "GBER", version, update rate, render rate, random seed
+#   frames: frame number, dt (ms), events handled by pollEmitter(), number of recorded events, then each event as
+#           a signal id, the length of its marshalled data, and the data. A signal id of _NEW_SIGNAL is followed
+#           by the length and UTF-8 bytes of a signal name not seen before, which takes the next id.
+_MAGIC = b"GBER"
+VERSION = 2
+_HEADER = struct.Struct("<4sHddQ")
+_FRAME = struct.Struct("<IdHI")
+_SHORT = struct.Struct("<H")
+_SIZE = struct.Struct("<I")
+_NEW_SIGNAL = 0xFFFF
+_MARSHAL_VERSION = 4 # Fixed so logs stay readable across Python versions.
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Recorder:
+    """
+    Writes every event pollEmitter() emits, frame by frame, along with each frame's time delta. Events emitted in
+    response to those (like "ACTION") aren't recorded, as they're emitted again when the log is played.
+    Normally created through Scheduler.record_to().
+    The random module is seeded when recording starts, and again with the same seed when the log is played.
+    """
+    def __init__(self, filename, update_rate=60, render_rate=60, seed=None):
+        if events._RECORDER is not None:
+            raise ReplayError("Already recording.")
+        if seed is None:
+            seed = time.time_ns() & 0xFFFFFFFF
+        self._file = open(filename, "wb")
+        self._file.write(_HEADER.pack(_MAGIC, VERSION, update_rate, render_rate, seed))
+        random.seed(seed)
+        self._signals = {} # signal -> id
+        self._frame = 0
+        self._pending = []
+        events._RECORDER = self
+
+    @property
+    def frame(self):
+        return self._frame
+
+    def record(self, signal, data):
+        try:
+            self._pending.append((signal, marshal.dumps(data, _MARSHAL_VERSION)))
+        except ValueError:
+            print("Event '{}' has data that can't be recorded. Skipped.".format(signal))
+
+    def end_frame(self, dt, handled):
+        """
+        Writes out the frame's events. dt is in milliseconds.
+        """
+        f = self._file
+        f.write(_FRAME.pack(self._frame, dt, min(handled, 0xFFFF), len(self._pending)))
+        for signal, data in self._pending:
+            sid = self._signals.get(signal)
+            if sid is None:
+                self._signals[signal] = len(self._signals)
+                name = signal.encode("utf-8")
+                f.write(_SHORT.pack(_NEW_SIGNAL))
+                f.write(_SHORT.pack(len(name)))
+                f.write(name)
+            else:
+                f.write(_SHORT.pack(sid))
+            f.write(_SIZE.pack(len(data)))
+            f.write(data)
+        self._pending = []
+        self._frame += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if events._RECORDER is self:
+            events._RECORDER = None
+
+
+def _Read(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ReplayError("Log ends in the middle of a frame.")
+    return data
+
+def read_log(filename):
+    """
+    Returns the update rate, render rate and random seed of a log, and a generator of its frames as
+    (frame, dt, handled, [(signal, data), ...]) tuples.
+    """
+    f = open(filename, "rb")
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        f.close()
+        raise ReplayError("'{}' is not an event log.".format(filename))
+    magic, version, update_rate, render_rate, seed = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        f.close()
+        raise ReplayError("'{}' is not an event log.".format(filename))
+    if version != VERSION:
+        f.close()
+        raise ReplayError("Unsupported event log version {}.".format(version))
+
+    def frames():
+        signals = []
+        with f:
+            while True:
+                fdata = f.read(_FRAME.size)
+                if len(fdata) == 0:
+                    return
+                if len(fdata) != _FRAME.size:
+                    raise ReplayError("Log ends in the middle of a frame.")
+                frame, dt, handled, count = _FRAME.unpack(fdata)
+                evts = []
+                for i in range(0, count):
+                    sid = _SHORT.unpack(_Read(f, _SHORT.size))[0]
+                    if sid == _NEW_SIGNAL:
+                        size = _SHORT.unpack(_Read(f, _SHORT.size))[0]
+                        signals.append(_Read(f, size).decode("utf-8"))
+                        sid = len(signals) - 1
+                    elif sid >= len(signals):
+                        raise ReplayError("Event with an unknown signal in frame {}.".format(frame))
+                    size = _SIZE.unpack(_Read(f, _SIZE.size))[0]
+                    evts.append((signals[sid], marshal.loads(_Read(f, size))))
+                yield (frame, dt, handled, evts)
+    return (update_rate, render_rate, seed, frames())
+
+
+def play(scheduler, filename):
+    """
+    Runs a recorded log through the scheduler as fast as possible: every frame's events are emitted, then the
+    scheduler advances by the frame's recorded time, so the same updates and renders happen as when recorded.
+    The scheduler takes on the rates the log was recorded with. It, and the game, should be in the state they were
+    in when recording started.
+    Returns a list of the real time, in milliseconds, each frame took to run.
+    """
+    update_rate, render_rate, seed, frames = read_log(filename)
+    scheduler.update_rate = update_rate
+    scheduler.render_rate = render_rate
+    random.seed(seed)
+    sm = scheduler._sm
+    times = []
+    for frame, dt, handled, evts in frames:
+        start = time.perf_counter()
+        idle = sm.idle
+        for signal, data in evts:
+            events._Replay(signal, data)
+        events.Events._FlushBatches()
+        scheduler._advance(dt, handled, idle)
+        times.append((time.perf_counter() - start) * 1000.0)
+    return times
@@ -3,6 +3,8 @@
 import os, sys
 import logging
 import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import pygame
 from .resourceLoaders import *
 
@@ -16,6 +18,7 @@ def _BuildLogger():
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
     log_format = logging.Formatter("[%(levelname)s : %(asctime)s] %(message)s")
+    os.makedirs(join_path(_GAME_PATH, "logs"), exist_ok=True)
     log_handler = logging.FileHandler(join_path(_GAME_PATH, "logs/gbe.log"))
     log_handler.setFormatter(log_format)
     logger.addHandler(log_handler)
@@ -23,8 +26,34 @@ def _BuildLogger():
 _l = _BuildLogger()
 
 _RESOURCES={}
+_PRELOADS={} # (rtype, src, params key) -> (future, params)
+_POOL=None
 
-def define_resource_type(rtype, sub_path, loader_fn, saver_fn=None):
+def _Pool():
+    global _POOL
+    if _POOL is None:
+        _POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gbe-preload")
+    return _POOL
+
+def _ParamsKey(params):
+    """
+    Returns a hashable key for a loader params dictionary. Instances loaded with different params are kept apart.
+    """
+    if params is None or len(params) <= 0:
+        return ()
+    try:
+        return tuple(sorted(params.items()))
+    except TypeError:
+        return tuple(sorted([(k, repr(v)) for k, v in params.items()]))
+
+def define_resource_type(rtype, sub_path, loader_fn, saver_fn=None, size_fn=None, decode_fn=None, finish_fn=None):
+    """
+    Defines a resource type. If given, size_fn(<instance>) returns how much of the type's budget a loaded instance
+    takes (see ResourceManager.set_budget()).
+    For ResourceManager.preload(), decode_fn(filename, params) is run on a background thread and
+    finish_fn(<decoded>, params) on the main thread to produce the instance. Without a decode_fn, loader_fn is run
+    on the background thread, so it must then be thread safe.
+    """
     global _RESOURCES, _GAME_PATH, join_path
     if rtype in _RESOURCES:
         _l.error("Resource '{}' already defined.".format(rtype))
@@ -34,7 +63,24 @@ def define_resource_type(rtype, sub_path, loader_fn, saver_fn=None):
         _l.warning("'{}' is not a valid directory.".format(sub_path))
     if not callable(loader_fn):
         raise ResourceError("Expected a callable as the resource loader.")
-    _RESOURCES[rtype]={"r":[], "loader":loader_fn, "saver":saver_fn, "path":fullpath}
+    if size_fn is not None and not callable(size_fn):
+        raise ResourceError("Expected a callable as the resource sizer.")
+    _RESOURCES[rtype]={
+        "r":{},
+        "loader":loader_fn,
+        "saver":saver_fn,
+        "sizer":size_fn,
+        "decoder":decode_fn,
+        "finisher":finish_fn,
+        "placeholder":None,
+        "path":fullpath,
+        "lru":OrderedDict(), # (src, params key) of every loaded instance. Least recently used first.
+        "used":0,
+        "budget":0, # 0 = Unlimited
+        "hits":0,
+        "misses":0,
+        "evictions":0
+    }
     _l.info("Added resource type '{}' with search path '{}'.".format(rtype, sub_path))
 
 
@@ -48,7 +94,9 @@ def configure(conf):
             if not os.path.isdir(fullpath):
                 _l.warning("'{}' is not a valid directory.".format(conf[key]))
             _RESOURCES[key]["path"] = fullpath
-            _RESOURCES[key]["r"] = [] # Completely drop old list.
+            _RESOURCES[key]["r"] = {} # Completely drop old index.
+            _RESOURCES[key]["lru"] = OrderedDict()
+            _RESOURCES[key]["used"] = 0
 
 class ResourceManager:
     def __init__(self):
@@ -70,16 +118,14 @@ class ResourceManager:
     def _getResourceDict(self, rtype, src):
         global _RESOURCES
         if rtype in _RESOURCES:
-            for r in _RESOURCES[rtype]["r"]:
-                if r["src"] == src:
-                    return r
+            return _RESOURCES[rtype]["r"].get(src)
         return None
 
     def is_valid(self, rtype, src):
         global _RESOURCES
         if rtype in _RESOURCES:
             return file_exists(join_path(_RESOURCES[rtype]["path"], src))
-        return false
+        return False
 
     def has(self, rtype, src):
         return (self._getResourceDict(rtype, src) is not None)
@@ -89,7 +135,8 @@ class ResourceManager:
         if rtype not in _RESOURCES:
             raise ResourceError("Unknown resource type '{}'.".format(rtype))
         if self._getResourceDict(rtype, src) == None:
-            _RESOURCES[rtype]["r"].append({"src":src, "instance":None, "locked":False})
+            # Loaded instances (and anything derived from them) are kept per loader params. See _ParamsKey().
+            _RESOURCES[rtype]["r"][src] = {"src":src, "instance":{}, "derived":{}, "sizes":{}, "locked":False}
         return self
 
     def remove(self, rtype, src):
@@ -97,7 +144,8 @@ class ResourceManager:
         d = self._getResourceDict(rtype, src)
         if d is None:
             raise ResourceError("No '{}' resource '{}' stored.".format(rtype, src))
-        _RESOURCES[rtype]["r"].remove(d)
+        self._releaseAll(rtype, d)
+        del _RESOURCES[rtype]["r"][src]
         return self
 
     def clear(self, rtype, src, ignore_lock=False):
@@ -105,26 +153,188 @@ class ResourceManager:
         if d is None:
             raise ResourceError("No '{}' resource '{}' stored.".format(rtype, src))
         if d["locked"] == False or ignore_lock == True:
-            d["instance"] = None
+            self._releaseAll(rtype, d)
         return self
 
-    def get(self, rtype, src, params={}):
+    def _account(self, rtype, d, pkey, instance):
+        rt = _RESOURCES[rtype]
+        size = 0
+        if rt["sizer"] is not None:
+            size = rt["sizer"](instance)
+        d["sizes"][pkey] = d["sizes"].get(pkey, 0) + size
+        rt["used"] += size
+        rt["lru"][(d["src"], pkey)] = True
+        rt["lru"].move_to_end((d["src"], pkey))
+
+    def _release(self, rtype, d, pkey):
+        rt = _RESOURCES[rtype]
+        rt["used"] -= d["sizes"].pop(pkey, 0)
+        rt["lru"].pop((d["src"], pkey), None)
+        d["instance"].pop(pkey, None)
+        d["derived"].pop(pkey, None)
+
+    def _releaseAll(self, rtype, d):
+        for pkey in list(d["instance"].keys()):
+            self._release(rtype, d, pkey)
+        d["derived"] = {}
+
+    def _enforceBudget(self, rtype, keep=None):
+        """
+        Evicts least recently used, unlocked instances until the type is within its budget.
+        The instance keyed by keep is never evicted.
+        """
+        rt = _RESOURCES[rtype]
+        if rt["budget"] <= 0 or rt["used"] <= rt["budget"]:
+            return
+        for key in list(rt["lru"].keys()):
+            if rt["used"] <= rt["budget"]:
+                break
+            d = rt["r"].get(key[0])
+            if key == keep or d is None or d["locked"]:
+                continue
+            self._release(rtype, d, key[1])
+            rt["evictions"] += 1
+            _l.debug("Evicted '{}' resource '{}'.".format(rtype, key[0]))
+
+    def get(self, rtype, src, params={}, wait=True):
+        """
+        Returns a weakref to the instance of the resource, loading it if needed.
+        If the resource is still being preloaded, this waits for it unless wait is False, in which case a weakref to
+        the type's placeholder (see set_placeholder()), or None, is returned instead.
+        """
         global _RESOURCES
         if rtype not in _RESOURCES:
             raise ResourceError("Unknown resource type '{}'.".format(rtype))
         d = self._getResourceDict(rtype, src)
         if d is None:
             raise ResourceError("No '{}' resource '{}' stored.".format(rtype, src))
-        if d["instance"] is None:
+        pkey = _ParamsKey(params)
+        instance = d["instance"].get(pkey)
+        if instance is None and (rtype, src, pkey) in _PRELOADS:
+            if wait == True or _PRELOADS[(rtype, src, pkey)][0].done():
+                return weakref.ref(self._handoff((rtype, src, pkey)))
+            placeholder = _RESOURCES[rtype]["placeholder"]
+            return weakref.ref(placeholder) if placeholder is not None else None
+        if instance is not None:
+            _RESOURCES[rtype]["hits"] += 1
+            _RESOURCES[rtype]["lru"].move_to_end((src, pkey))
+        else:
+            _RESOURCES[rtype]["misses"] += 1
             loader = _RESOURCES[rtype]["loader"]
             filename = join_path(_RESOURCES[rtype]["path"], src)
             try:
-                d["instance"] = loader(filename, params)
+                instance = loader(filename, params)
             except Exception as e:
                 raise e
                 _l.error("{}".format(e))
                 return None
-        return weakref.ref(d["instance"])
+            d["instance"][pkey] = instance
+            self._account(rtype, d, pkey, instance)
+            self._enforceBudget(rtype, (src, pkey))
+        return weakref.ref(instance)
+
+    def preload(self, rtype, srcs, params={}):
+        """
+        Starts loading src (or each src in a list of them) on a background thread, storing any not stored yet.
+        Returns a list with one future per src, done once the file is decoded. Decoded resources are handed off
+        to the resource manager on the main thread by collect_preloads() or get().
+        The futures only signal completion. Their results aren't resources (they're whatever the decoder returned,
+        or None for a src that was already loaded), so always use get() for the resource itself.
+        """
+        global _RESOURCES, _PRELOADS
+        if rtype not in _RESOURCES:
+            raise ResourceError("Unknown resource type '{}'.".format(rtype))
+        if isinstance(srcs, str):
+            srcs = [srcs]
+        rt = _RESOURCES[rtype]
+        decode = rt["decoder"] if rt["decoder"] is not None else rt["loader"]
+        pkey = _ParamsKey(params)
+        futures = []
+        for src in srcs:
+            self.store(rtype, src)
+            key = (rtype, src, pkey)
+            if key in _PRELOADS:
+                futures.append(_PRELOADS[key][0])
+            elif pkey in self._getResourceDict(rtype, src)["instance"]:
+                f = Future()
+                f.set_result(None) # Already loaded. Nothing was decoded.
+                futures.append(f)
+            else:
+                f = _Pool().submit(decode, join_path(rt["path"], src), params)
+                _PRELOADS[key] = (f, params)
+                futures.append(f)
+        return futures
+
+    def _handoff(self, key):
+        """
+        Waits for the preload of key, then finishes and stores the instance. Returns the instance.
+        """
+        global _RESOURCES, _PRELOADS
+        future, params = _PRELOADS[key]
+        rtype, src, pkey = key
+        try:
+            data = future.result()
+        finally:
+            _PRELOADS.pop(key, None)
+        rt = _RESOURCES[rtype]
+        d = self._getResourceDict(rtype, src)
+        if d is None:
+            raise ResourceError("No '{}' resource '{}' stored.".format(rtype, src))
+        if pkey not in d["instance"]:
+            instance = rt["finisher"](data, params) if rt["finisher"] is not None else data
+            rt["misses"] += 1
+            d["instance"][pkey] = instance
+            self._account(rtype, d, pkey, instance)
+            self._enforceBudget(rtype, (src, pkey))
+        return d["instance"][pkey]
+
+    def collect_preloads(self):
+        """
+        Hands off every finished preload. Call from the main thread, once per frame. Returns the number handed off.
+        """
+        global _PRELOADS
+        if len(_PRELOADS) <= 0:
+            return 0
+        count = 0
+        for key in [k for k, p in _PRELOADS.items() if p[0].done()]:
+            try:
+                self._handoff(key)
+                count += 1
+            except Exception as e:
+                _l.error("Failed to preload '{}' resource '{}': {}".format(key[0], key[1], e))
+        return count
+
+    @property
+    def preloading(self):
+        global _PRELOADS
+        return len(_PRELOADS)
+
+    def set_placeholder(self, rtype, instance):
+        """
+        Sets the instance get() hands out, when asked not to wait, for rtype resources still being preloaded.
+        """
+        global _RESOURCES
+        if rtype not in _RESOURCES:
+            raise ResourceError("Unknown resource type '{}'.".format(rtype))
+        _RESOURCES[rtype]["placeholder"] = instance
+        return self
+
+    def get_derived(self, rtype, src, name, build_fn, params={}):
+        """
+        Returns a weakref to an instance built by build_fn(<resource instance>) and stored under the given name.
+        The derived instance is built once and lives exactly as long as the loaded resource instance it was built from.
+        """
+        src_ref = self.get(rtype, src, params)
+        if src_ref is None or src_ref() is None:
+            return None
+        d = self._getResourceDict(rtype, src)
+        pkey = _ParamsKey(params)
+        derived = d["derived"].setdefault(pkey, {})
+        if name not in derived:
+            derived[name] = build_fn(src_ref())
+            self._account(rtype, d, pkey, derived[name])
+            self._enforceBudget(rtype, (src, pkey))
+        return weakref.ref(derived[name])
 
     def load(self, rtype, src, params={}):
         global _RESOURCES
@@ -167,9 +377,9 @@ class ResourceManager:
     def clear_resource_type(self, rtype, ignore_lock=False):
         global _RESOURCES
         if rtype in _RESOURCES:
-            for r in _RESOURCES[rtype]["r"]:
+            for r in _RESOURCES[rtype]["r"].values():
                 if r["locked"] == False or ignore_lock == True:
-                    r["instance"] = None
+                    self._releaseAll(rtype, r)
         return self
 
     def clear_resources(self, ignore_lock=False):
@@ -182,22 +392,76 @@ class ResourceManager:
         global _RESOURCES
         if rtype not in _RESOURCES:
             raise ResourceError("Unknown resource type '{}'.".format(rtype))
-        _RESOURCES[rtype]["r"] = []
+        _RESOURCES[rtype]["r"] = {}
+        _RESOURCES[rtype]["lru"] = OrderedDict()
+        _RESOURCES[rtype]["used"] = 0
         return self
 
     def remove_resources(self):
         global _RESOURCES
         for key in _RESOURCES:
-            _RESOURCES[key]["r"] = []
+            self.remove_resource_type(key)
+        return self
+
+    def set_budget(self, rtype, budget):
+        """
+        Sets how much the loaded instances of rtype may take before least recently used, unlocked instances are
+        evicted. Units are those of the type's size_fn: bytes for graphics and audio, instances for fonts.
+        A budget of 0 is unlimited.
+        """
+        global _RESOURCES
+        if rtype not in _RESOURCES:
+            raise ResourceError("Unknown resource type '{}'.".format(rtype))
+        if not isinstance(budget, int):
+            raise TypeError("Expected integer value.")
+        if budget < 0:
+            raise ValueError("Budget cannot be negative.")
+        _RESOURCES[rtype]["budget"] = budget
+        self._enforceBudget(rtype)
+        return self
+
+    def get_budget(self, rtype):
+        global _RESOURCES
+        if rtype not in _RESOURCES:
+            raise ResourceError("Unknown resource type '{}'.".format(rtype))
+        return _RESOURCES[rtype]["budget"]
+
+    def stats(self, rtype=None):
+        """
+        Returns {"loaded", "used", "budget", "hits", "misses", "evictions"} for rtype, or a dictionary of those
+        for every resource type if rtype is None.
+        """
+        global _RESOURCES
+        if rtype is None:
+            return {key:self.stats(key) for key in _RESOURCES}
+        if rtype not in _RESOURCES:
+            raise ResourceError("Unknown resource type '{}'.".format(rtype))
+        rt = _RESOURCES[rtype]
+        return {
+            "loaded":len(rt["lru"]),
+            "used":rt["used"],
+            "budget":rt["budget"],
+            "hits":rt["hits"],
+            "misses":rt["misses"],
+            "evictions":rt["evictions"]
+        }
+
+    def reset_stats(self, rtype=None):
+        global _RESOURCES
+        for key in ([rtype] if rtype is not None else _RESOURCES.keys()):
+            if key in _RESOURCES:
+                _RESOURCES[key]["hits"] = 0
+                _RESOURCES[key]["misses"] = 0
+                _RESOURCES[key]["evictions"] = 0
         return self
 
 
 # ---------------------------------------------------------------
 # Defining the built-in loaders located in resourceLoaders.py
 # ---------------------------------------------------------------
-define_resource_type("graphic", "graphics/", load_image)
-define_resource_type("audio", "audio/", load_audio)
+define_resource_type("graphic", "graphics/", load_image, None, size_image, decode_image, finish_image)
+define_resource_type("audio", "audio/", load_audio, None, size_audio, decode_file, finish_audio)
 define_resource_type("json", "data/json/", load_JSON)
 define_resource_type("maps", "data/maps/", load_JSON)
 define_resource_type("user_maps", "maps/", load_JSON, save_JSON)
-define_resource_type("font", "fonts/", load_font)
+define_resource_type("font", "fonts/", load_font, None, size_font, decode_file, finish_font)
@@ -1,4 +1,5 @@
 import os
+import io
 import json
 import pygame
 
@@ -20,21 +21,46 @@ def file_exists(path):
 
 
 def load_image(filename, params={}):
+    return finish_image(decode_image(filename, params), params)
+
+# The decode_* functions are safe to run on a background thread. The matching finish_* function turns their
+# result into the resource instance, and must run on the main thread.
+def decode_image(filename, params={}):
     if not os.path.isfile(filename):
         raise LoadError("Failed to load '{}'. Path missing or invalid.".format(filename))
     try:
-        i = pygame.image.load(filename)
-        return i.convert_alpha()
+        return pygame.image.load(filename)
+    except pygame.error as e:
+        raise LoadError("Pygame/SDL Exception: {}".format(e))
+
+def finish_image(surface, params={}):
+    try:
+        return surface.convert_alpha()
     except pygame.error as e:
         raise LoadError("Pygame/SDL Exception: {}".format(e))
 
 
+def decode_file(filename, params={}):
+    if not os.path.isfile(filename):
+        raise LoadError("Failed to load '{}'. Path missing or invalid.".format(filename))
+    with open(filename, "rb") as f:
+        return f.read()
+
+
 def load_audio(filename, params={}):
     if not os.path.isfile(filename):
         raise LoadError("Failed to load '{}'. Path missing or invalid.".format(filename))
+    return finish_audio(filename, params)
+
+def finish_audio(data, params={}):
+    """
+    data is either a filename or the bytes from decode_file().
+    """
     try:
         if pygame.mixer.get_init() is not None:
-            return pygame.mixer.Sound(filename)
+            if isinstance(data, bytes):
+                return pygame.mixer.Sound(file=io.BytesIO(data))
+            return pygame.mixer.Sound(data)
     except pygame.error as e:
         raise LoadError("Pygame Exception: {}".format(e))
     raise LoadError("Audio subsystem not initialized before attempting to obtain resource.")
@@ -42,18 +68,42 @@ def load_audio(filename, params={}):
 def load_font(filename, params={}):
     if not os.path.isfile(filename):
         raise LoadError("Failed to load '{}'. Path missing or invalid.".format(filename))
+    return finish_font(filename, params)
+
+def finish_font(data, params={}):
+    """
+    data is either a filename or the bytes from decode_file().
+    """
     try:
         if pygame.font.get_init():
             size = 26
             if "size" in params:
                 if isinstance(params["size"], int) and params["size"] > 0:
                     size = params["size"]
-            return pygame.font.Font(filename, size)
+            if isinstance(data, bytes):
+                return pygame.font.Font(io.BytesIO(data), size)
+            return pygame.font.Font(data, size)
     except pygame.error as e:
         raise LoadError("Pygame Exception: {}".format(e))
     raise LoadError("Font subsystem not initialized before attempting to obtain resource.")
 
 
+def size_image(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+def size_audio(sound):
+    # Estimated from the sound's length, in the mixer's sample format.
+    mixer = pygame.mixer.get_init()
+    if mixer is None:
+        return 0
+    freq, fmt, channels = mixer
+    return int(sound.get_length() * freq * channels * (abs(fmt) // 8))
+
+def size_font(font):
+    # Fonts are budgeted by count.
+    return 1
+
+
 class DataContainer:
     def __init__(self, data):
         self._data = data
@@ -63,7 +113,7 @@ class DataContainer:
 
 def load_JSON(filename, params={}):
     if not os.path.isfile(filename):
-        raise LoaderError("File '{}' is missing or not a file.".format(filename))
+        raise LoadError("File '{}' is missing or not a file.".format(filename))
     data = None
     try:
         with open(filename) as f:
@@ -0,0 +1,147 @@
+from . import events
+from .replay import Recorder
+from .resource import ResourceManager
+from .time import Time
+
+
+class Scheduler:
+    """
+    Drives a StateMachine with a fixed update rate and a capped render rate.
+    Updates are run in fixed steps from an accumulator of elapsed time. While the active state has nothing that
+    needs updating every frame, the scheduler blocks waiting on input instead of spinning.
+    """
+    def __init__(self, statemachine, update_rate=60, render_rate=60):
+        self._sm = statemachine
+        self._time = Time()
+        self._resources = ResourceManager()
+        self._update_step = 0
+        self._render_step = 0
+        self._max_updates = 5 # Most updates run in a single step before dropping the backlog.
+        self._idle_timeout = 250 # Milliseconds
+        self._accum = 0
+        self._since_render = 0
+        self._render_pending = True
+        self._recorder = None
+        self.update_rate = update_rate
+        self.render_rate = render_rate
+        self._time.reset()
+
+    @property
+    def update_rate(self):
+        return 1000.0 / self._update_step
+    @update_rate.setter
+    def update_rate(self, rate):
+        if not isinstance(rate, (int, float)):
+            raise TypeError("Expected number value.")
+        if rate <= 0:
+            raise ValueError("Update rate must be greater than zero.")
+        self._update_step = 1000.0 / rate
+
+    @property
+    def render_rate(self):
+        """
+        Maximum frames rendered per second. 0 leaves rendering uncapped.
+        """
+        if self._render_step <= 0:
+            return 0
+        return 1000.0 / self._render_step
+    @render_rate.setter
+    def render_rate(self, rate):
+        if not isinstance(rate, (int, float)):
+            raise TypeError("Expected number value.")
+        if rate < 0:
+            raise ValueError("Render rate cannot be negative.")
+        self._render_step = 0 if rate == 0 else 1000.0 / rate
+
+    @property
+    def max_updates(self):
+        return self._max_updates
+    @max_updates.setter
+    def max_updates(self, count):
+        if not isinstance(count, int):
+            raise TypeError("Expected integer value.")
+        if count <= 0:
+            raise ValueError("Max updates must be greater than zero.")
+        self._max_updates = count
+
+    @property
+    def idle_timeout(self):
+        """
+        Longest time, in milliseconds, to block waiting on input while idle.
+        """
+        return self._idle_timeout
+    @idle_timeout.setter
+    def idle_timeout(self, timeout):
+        if not isinstance(timeout, int):
+            raise TypeError("Expected integer value.")
+        if timeout < 0:
+            raise ValueError("Timeout cannot be negative.")
+        self._idle_timeout = timeout
+
+    @property
+    def recording(self):
+        return self._recorder is not None
+
+    def record_to(self, filename):
+        """
+        Starts recording every input event and frame time to a log that replay.play() can run back.
+        """
+        self.stop_recording()
+        self._recorder = Recorder(filename, self.update_rate, self.render_rate)
+
+    def stop_recording(self):
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    def step(self):
+        """
+        Runs one iteration of the main loop: handle input, run any due updates, and render if a frame is due.
+        """
+        sm = self._sm
+        idle = sm.idle
+
+        # Wait on input for however long we can before the next update or render is due.
+        wait = self._idle_timeout if idle else self._update_step - self._accum
+        if self._render_pending:
+            wait = min(wait, self._render_step - self._since_render)
+        if self._resources.preloading > 0:
+            wait = min(wait, self._update_step) # Don't leave finished preloads waiting on input.
+        handled = events.pollEmitter(max(0, int(wait)))
+        dt = self._time.delta
+        if self._recorder is not None:
+            self._recorder.end_frame(dt, handled)
+        self._advance(dt, handled, idle)
+
+    def _advance(self, dt, handled, idle):
+        """
+        Runs whatever updates and rendering are due after dt milliseconds, given the number of events handled
+        and whether the state machine was idle before they were.
+        """
+        sm = self._sm
+        if handled > 0:
+            self._render_pending = True
+        if self._resources.collect_preloads() > 0:
+            self._render_pending = True
+
+        self._since_render += dt
+        if idle:
+            self._accum = 0
+        else:
+            self._accum += dt
+            updates = 0
+            while self._accum >= self._update_step:
+                if updates >= self._max_updates:
+                    # Too far behind to ever catch up. Drop the backlog rather than spiral.
+                    self._accum = 0
+                    break
+                sm.update(self._update_step)
+                self._accum -= self._update_step
+                updates += 1
+            if updates > 0:
+                self._render_pending = True
+
+        if self._render_pending and self._since_render >= self._render_step:
+            sm.render()
+            self._since_render = 0
+            self._render_pending = False
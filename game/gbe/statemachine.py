@@ -1,5 +1,6 @@
 
-from .events import Events
+from . import nodes
+from .events import Events, Input
 from .nodes import Node
 from .time import Time
 from .display import Display
@@ -18,13 +19,29 @@ _HOLD_STATE = None
 # List of all states registered into the State Manager.
 _STATE_LIST = []
 
-_TIME = Time()
+# Each registered state keeps its own clock, keyed by the state's root Node.
+_CLOCKS = {}
+
+# Caches whether the active state's tree has anything to update, as (state, tree version, needs_update).
+_ACTIVE_UPDATES = (None, -1, False)
 
 
 class StateMachine:
     def __init__(self):
         Events.listen("SCENECHANGE", self.on_scenechange)
 
+    @property
+    def idle(self):
+        """
+        Returns true if the active state has no nodes that need updating every frame.
+        """
+        global _ACTIVE_STATE, _ACTIVE_UPDATES
+        if _ACTIVE_STATE is None:
+            return True
+        if _ACTIVE_UPDATES[0] is not _ACTIVE_STATE or _ACTIVE_UPDATES[1] != nodes._TREE_VERSION:
+            _ACTIVE_UPDATES = (_ACTIVE_STATE, nodes._TREE_VERSION, _ACTIVE_STATE._needsUpdate())
+        return not _ACTIVE_UPDATES[2]
+
     def on_scenechange(self, event, params):
         if "scene" in params and "hold" in params:
             self.activate_node(params["scene"], params["hold"])
@@ -51,32 +68,48 @@ class StateMachine:
             node = node.root
         if self.has_node(node.name):
             raise StateMachineError("State machine already registered node named '{}'. Names must be unique.".format(node.name))
-        global _STATE_LIST
+        global _STATE_LIST, _CLOCKS
         _STATE_LIST.append(node)
+        _CLOCKS[node] = Time()
+
+    def get_clock(self, name=None):
+        """
+        Returns the Time instance of the registered state with the given name, or of the active state if no name is given.
+        """
+        global _ACTIVE_STATE, _STATE_LIST, _CLOCKS
+        if name is None:
+            if _ACTIVE_STATE is None:
+                return None
+            return _CLOCKS[_ACTIVE_STATE]
+        for n in _STATE_LIST:
+            if n.name == name:
+                return _CLOCKS[n]
+        return None
 
     def activate_node(self, name, hold_previous=False):
         """
 
         """
-        global _ACTIVE_STATE, _TIME
+        global _ACTIVE_STATE
         if self.has_node(name):
             if _ACTIVE_STATE is not None:
                 if _ACTIVE_STATE.name == name:
                     return
                 self._releaseActive(hold_previous)
             self._setActive(name)
-            if _ACTIVE_STATE is not None:
-                _TIME.reset()
+            Display.mark_dirty()
 
 
     def _releaseActive(self, hold_previous):
-        global _ACTIVE_STATE, _HOLD_STATE
+        global _ACTIVE_STATE, _HOLD_STATE, _CLOCKS
         a = _ACTIVE_STATE
         a._pause()
+        _CLOCKS[a].pause()
         if _HOLD_STATE is not None:
             _ACTIVE_STATE = _HOLD_STATE
             _HOLD_STATE = None
             _ACTIVE_STATE._start()
+            _CLOCKS[_ACTIVE_STATE].resume()
         else:
             _ACTIVE_STATE = None
         
@@ -86,7 +119,7 @@ class StateMachine:
             a._close()
 
     def _setActive(self, name):
-        global _ACTIVE_STATE, _STATE_LIST
+        global _ACTIVE_STATE, _HOLD_STATE, _STATE_LIST, _CLOCKS
         for n in _STATE_LIST:
             if n.name == name:
                 _ACTIVE_STATE = n
@@ -94,6 +127,9 @@ class StateMachine:
         if _ACTIVE_STATE is not None:
             _ACTIVE_STATE._init()
             _ACTIVE_STATE._start()
+            clock = _CLOCKS[_ACTIVE_STATE]
+            clock.reset()
+            clock.resume()
         elif _HOLD_STATE is not None:
             # If we failed to find an Active state, then we need to drop any hold state as well...
             # Keep things as clean as possible
@@ -101,7 +137,7 @@ class StateMachine:
             _HOLD_STATE = None
 
     def close(self):
-        global _ACTIVE_STATE, _HOLD_STATE, _STATE_LIST
+        global _ACTIVE_STATE, _HOLD_STATE, _STATE_LIST, _CLOCKS
         if _HOLD_STATE is not None:
             _HOLD_STATE._close()
             _HOLD_STATE = None
@@ -110,14 +146,32 @@ class StateMachine:
             _ACTIVE_STATE._close()
             _ACTIVE_STATE = None
         _STATE_LIST = []
+        _CLOCKS = {}
 
-    def update(self):
-        global _ACTIVE_STATE, _TIME
+    def update(self, dt=None):
+        """
+        Updates the active state. If dt (in milliseconds) is not given, the time since the last update is used, and
+        the state's clock goes back to following the wall clock if it was being driven by given dts.
+        Either way, dt is run through the active state's clock, so pausing or scaling that clock applies.
+        """
+        global _ACTIVE_STATE, _CLOCKS
         if _ACTIVE_STATE is not None:
-            _ACTIVE_STATE._update(_TIME.delta)
+            clock = _CLOCKS[_ACTIVE_STATE]
+            if dt is None:
+                if clock.driven:
+                    clock.drive(False)
+                dt = clock.delta
+            else:
+                dt = clock.advance(dt / 1000.0) * 1000.0
+            _ACTIVE_STATE._update(dt)
+            Input._NextFrame()
 
     def render(self):
         global _ACTIVE_STATE, _HOLD_STATE
+        if Display.damage_tracking:
+            self._renderDirty()
+            return
+
         dsurf = Display.surface
         if dsurf is not None:
             Display.clear()
@@ -131,7 +185,31 @@ class StateMachine:
 
             Display.flip()
 
+    def _renderDirty(self):
+        global _ACTIVE_STATE, _HOLD_STATE
+        dsurf = Display.surface
+        if dsurf is None or not Display.dirty:
+            return # Nothing changed since the last frame.
 
+        if Display.full_redraw:
+            # Whatever the states cached in their surfaces can't be trusted for a full redraw.
+            if _HOLD_STATE is not None:
+                _HOLD_STATE._markTreeDirty()
+            if _ACTIVE_STATE is not None:
+                _ACTIVE_STATE._markTreeDirty()
+        rects = Display.get_dirty_rects()
+        # Clear the flags before rendering so anything flagged during rendering is picked up next frame.
+        Display.clear_dirty()
+        if len(rects) <= 0:
+            return
+        area = rects[0].unionall(rects[1:]).clip(dsurf.get_rect())
+
+        dsurf.set_clip(area)
+        Display.clear()
+        if _HOLD_STATE is not None:
+            _HOLD_STATE._render(dsurf)
+        if _ACTIVE_STATE is not None:
+            _ACTIVE_STATE._render(dsurf)
+        dsurf.set_clip(None)
 
-
-
+        Display.flip([area])
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+import pygame
+from .resource import ResourceManager
+
+
+_ATLAS_WIDTH = 512
+
+
+class _GlyphAtlas:
+    """
+    Every glyph of one font, size, antialias and color combination rendered so far, packed into rows of a
+    single surface.
+    """
+    def __init__(self, height, antialias, color):
+        self._antialias = antialias
+        self._color = color
+        self._height = height
+        self._surface = pygame.Surface((_ATLAS_WIDTH, height), pygame.SRCALPHA)
+        self._surface.fill(pygame.Color(0,0,0,0))
+        self._glyphs = {} # character -> rect within the atlas surface
+        self._pen = [0, 0]
+
+    @property
+    def surface(self):
+        return self._surface
+
+    @property
+    def height(self):
+        return self._height
+
+    @property
+    def glyph_count(self):
+        return len(self._glyphs)
+
+    def glyph(self, font, ch):
+        rect = self._glyphs.get(ch)
+        if rect is None:
+            g = font.render(ch, self._antialias, self._color)
+            if g.get_flags() & pygame.SRCALPHA == 0:
+                # Non-antialiased glyphs come back color keyed. The blend below ignores keys, so use alpha instead.
+                a = pygame.Surface(g.get_size(), pygame.SRCALPHA)
+                a.fill(pygame.Color(0,0,0,0))
+                a.blit(g, (0,0))
+                g = a
+            w = g.get_width()
+            if w > _ATLAS_WIDTH:
+                return None
+            if self._pen[0] + w > _ATLAS_WIDTH:
+                self._pen = [0, self._pen[1] + self._height]
+            if self._pen[1] + self._height > self._surface.get_height():
+                self._grow()
+            rect = pygame.Rect(self._pen[0], self._pen[1], w, self._height)
+            self._surface.blit(g, rect.topleft, None, pygame.BLEND_RGBA_MAX)
+            self._glyphs[ch] = rect
+            self._pen[0] += w
+        return rect
+
+    def _grow(self):
+        old = self._surface
+        self._surface = pygame.Surface((_ATLAS_WIDTH, old.get_height() * 2), pygame.SRCALPHA)
+        self._surface.fill(pygame.Color(0,0,0,0))
+        self._surface.blit(old, (0,0), None, pygame.BLEND_RGBA_MAX)
+
+
+class _TextCache:
+    """
+    Renders strings by blitting glyphs from cached atlases, and keeps the most recently rendered strings around.
+    Fonts are fetched through the ResourceManager, which keeps one font instance per file and size.
+    Glyphs are placed by their advance, without kerning, which matches Font.render() for the pixel fonts used here.
+    """
+    def __init__(self, capacity=256):
+        self._atlases = {} # (font_src, size, antialias, color) -> _GlyphAtlas
+        self._strings = OrderedDict() # (font_src, size, antialias, color, background, text) -> Surface
+        self._capacity = capacity
+        self._hits = 0
+        self._misses = 0
+        self._rm = ResourceManager()
+
+    @property
+    def capacity(self):
+        return self._capacity
+    @capacity.setter
+    def capacity(self, capacity):
+        if not isinstance(capacity, int):
+            raise TypeError("Expected integer value.")
+        if capacity < 0:
+            raise ValueError("Capacity cannot be negative.")
+        self._capacity = capacity
+        self._trim()
+
+    @property
+    def stats(self):
+        return {
+            "hits":self._hits,
+            "misses":self._misses,
+            "strings":len(self._strings),
+            "atlases":len(self._atlases),
+            "glyphs":sum([a.glyph_count for a in self._atlases.values()])
+        }
+
+    def clear(self):
+        self._atlases = {}
+        self._strings = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def render(self, font_src, size, text, antialias, color, background=None):
+        """
+        Returns a surface with text rendered in the given font, or None if the font isn't available.
+        The returned surface is shared, so it must not be drawn on.
+        """
+        color = tuple(color)
+        if background is not None:
+            background = tuple(background)
+        key = (font_src, size, antialias, color, background, text)
+        surf = self._strings.get(key)
+        if surf is not None:
+            self._hits += 1
+            self._strings.move_to_end(key)
+            return surf
+        self._misses += 1
+
+        fnt = self._rm.get("font", font_src, {"size":size})
+        if fnt is None or fnt() is None:
+            return None
+        fnt = fnt()
+        akey = (font_src, size, antialias, color)
+        atlas = self._atlases.get(akey)
+        if atlas is None:
+            atlas = _GlyphAtlas(fnt.get_height(), antialias, color)
+            self._atlases[akey] = atlas
+
+        rects = [atlas.glyph(fnt, ch) for ch in text]
+        if None in rects or (antialias and background is not None and background[3] < 255):
+            # Oversized glyphs, or edges the font blends into a translucent background. Let the font deal with it.
+            surf = fnt.render(text, antialias, color, background)
+        else:
+            surf = pygame.Surface((max(1, sum([r.width for r in rects])), atlas.height), pygame.SRCALPHA)
+            # Onto a transparent surface glyphs are copied as they are. Onto a background they're blended.
+            flags = pygame.BLEND_RGBA_MAX
+            if background is not None:
+                surf.fill(pygame.Color(background[0], background[1], background[2])) # Like Font.render(), ignores alpha.
+                flags = 0
+            else:
+                surf.fill(pygame.Color(0,0,0,0))
+            blits = []
+            x = 0
+            for r in rects:
+                blits.append((atlas.surface, (x, 0), r, flags))
+                x += r.width
+            surf.blits(blits, False)
+
+        if self._capacity > 0:
+            self._strings[key] = surf
+            self._trim()
+        return surf
+
+    def _trim(self):
+        while len(self._strings) > self._capacity:
+            self._strings.popitem(last=False)
+
+# The one and only text cache.
+TextCache = _TextCache()
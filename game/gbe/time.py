@@ -7,40 +7,117 @@
 import time
 
 class Time:
-    def __init__(self):
-        self._dticks = 0
-        self._ldelta = 0
-        self._lastTick = 0
+    """
+    Monotonic, high resolution clock.
+    Time is tracked in seconds. The millisecond properties (delta, last_delta, aliveTicks) remain for the
+    rest of the engine, which works in milliseconds. All deltas are multiplied by scale and are zero while paused.
+    A clock either follows the wall clock through tick(), or is driven by explicit deltas through advance(). Once
+    advance() is called, wall time no longer counts towards it, until drive(False) or reset() is called.
+    """
+    def __init__(self, scale=1.0):
+        self._alive = 0.0 # Seconds of (scaled) time since the last reset.
+        self._ldelta = 0.0
+        self._lastTick = time.perf_counter_ns()
+        self._paused = False
+        self._driven = False
+        self._scale = 1.0
+        self.scale = scale
+
+    @property
+    def scale(self):
+        return self._scale
+    @scale.setter
+    def scale(self, scale):
+        if not isinstance(scale, (int, float)):
+            raise TypeError("Expected number value.")
+        if scale < 0:
+            raise ValueError("Scale cannot be negative.")
+        if not self._driven:
+            self.tick() # Time passed so far belongs to the old scale.
+        self._scale = float(scale)
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def driven(self):
+        return self._driven
+
+    def drive(self, driven=True):
+        """
+        Switches the clock between being driven by advance() (True) and following the wall clock (False).
+        Wall time is counted from the last tick() or advance().
+        """
+        self._driven = (driven == True)
 
     @property
     def delta(self):
-        tick = int(round(time.time() * 1000))
-        dt = 0
-        if self._lastTick > 0:
-            dt = tick - self._lastTick
-            self._lastTick = tick
-            self._ldelta = dt
-            self._dticks += dt
-        return dt
+        return self.tick() * 1000.0
 
     @property
     def last_delta(self):
+        return self._ldelta * 1000.0
+
+    @property
+    def last_delta_seconds(self):
         return self._ldelta
 
     @property
     def aliveTicks(self):
-        tick = int(round(time.time() * 1000))
-        dt = 0
-        if self._lastTick > 0:
-            dt = tick - self._lastTick
-        return self._dticks + dt
+        return self.aliveSeconds * 1000.0
 
     @property
     def aliveSeconds(self):
-        return self.aliveTicks / 1000.0
+        if self._paused or self._driven:
+            return self._alive
+        return self._alive + (((time.perf_counter_ns() - self._lastTick) / 1000000000.0) * self._scale)
+
+    def tick(self):
+        """
+        Returns the (scaled) seconds passed since the last tick. Always zero for a driven clock.
+        """
+        now = time.perf_counter_ns()
+        dt = (now - self._lastTick) / 1000000000.0
+        self._lastTick = now
+        if self._driven:
+            return 0.0
+        return self._Apply(dt)
+
+    def advance(self, dt):
+        """
+        Advances the clock by dt unscaled seconds and returns the scaled seconds actually applied.
+        From then on, the clock is driven: only advance() moves it.
+        """
+        self._driven = True
+        self._lastTick = time.perf_counter_ns()
+        return self._Apply(dt)
+
+    def _Apply(self, dt):
+        if self._paused:
+            dt = 0.0
+        else:
+            dt *= self._scale
+        self._ldelta = dt
+        self._alive += dt
+        return dt
+
+    def pause(self):
+        if not self._paused:
+            if not self._driven:
+                self.tick()
+            self._paused = True
+
+    def resume(self):
+        if self._paused:
+            self._paused = False
+            self._lastTick = time.perf_counter_ns()
 
     def reset(self):
-        self.dticks = 0
-        self._lastTick = int(round(time.time() * 1000))
+        self._driven = False
+        self._alive = 0.0
+        self._ldelta = 0.0
+        self._lastTick = time.perf_counter_ns()
+
 
 
@@ -0,0 +1,523 @@
+'''
+    Binary map files.
+
+    Layout (all values little-endian):
+        Header      : magic "GBMP", version (u16), layer count (u16), player x (i32), player y (i32),
+                      player orientation (u8, 0-3 = n, e, s, w), player layer name (u16 length + utf-8)
+        Layer table : per layer, name (u16 length + utf-8), width (u32), height (u32), data offset (u64),
+                      door target length (u32)
+        Layer data  : at the layer's data offset, the MapLayer arrays one after another (horizon, ground, walls,
+                      blocking, doors). Every cell takes the same 17 bytes, so a layer is read straight into its
+                      arrays. The layer's door targets follow as a JSON list of [face index, target] pairs.
+
+    Files are memory mapped and layers are only decoded the first time they're used, either whole or, with
+    ChunkedLayer, one square chunk of cells at a time.
+    Convert between the JSON ("0.0.1") and binary formats with...
+        python mapconv.py <src> <dst>
+'''
+import os
+import sys
+import json
+import mmap
+import struct
+import threading
+from array import array
+from collections.abc import MutableMapping
+from . import gbe
+from .maplayer import MapLayer
+
+
+MAGIC = b"GBMP"
+VERSION = 1
+EXTENSION = ".gbm"
+JSON_VERSION = "0.0.1"
+
+_HEADER = struct.Struct("<4sHHiiB")
+_LAYER_ENTRY = struct.Struct("<IIQI")
+_LENGTH = struct.Struct("<H")
+# MapLayer attribute, array type code, entries per cell.
+_FIELDS = (("horizon", "h", 1), ("ground", "h", 1), ("walls", "h", 4), ("blocking", "B", 1), ("doors", "b", 4))
+_ORIENTATIONS = ("n", "e", "s", "w")
+
+
+class MapFileError(Exception):
+    pass
+
+
+def _CellBytes():
+    return sum([array(code).itemsize * count for attr, code, count in _FIELDS])
+
+def _PackString(s):
+    b = s.encode("utf-8")
+    return _LENGTH.pack(len(b)) + b
+
+def _UnpackString(buf, offset):
+    length = _LENGTH.unpack_from(buf, offset)[0]
+    offset += _LENGTH.size
+    return (bytes(buf[offset:offset+length]).decode("utf-8"), offset + length)
+
+
+class MapFile:
+    """
+    A memory mapped binary map file. Only the header and layer table are read when opened.
+    """
+    def __init__(self, filename):
+        self._filename = filename
+        self._mm = None
+        self._table = {}
+        self._targets = {}
+        self._player = None
+        try:
+            with open(filename, "rb") as f:
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise MapFileError("Failed to open '{}': {}".format(filename, e))
+        try:
+            self._readTable()
+        except (struct.error, UnicodeDecodeError) as e:
+            self.close()
+            raise MapFileError("'{}' is truncated or corrupt: {}".format(filename, e))
+        except MapFileError as e:
+            self.close()
+            raise e
+
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def closed(self):
+        return self._mm is None
+
+    @property
+    def layer_names(self):
+        return list(self._table.keys())
+
+    @property
+    def player(self):
+        return dict(self._player)
+
+    def _readTable(self):
+        mm = self._mm
+        magic, version, count, px, py, orient = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise MapFileError("'{}' is not a binary map file.".format(self._filename))
+        if version != VERSION:
+            raise MapFileError("Unsupported map file version {}.".format(version))
+        if orient >= len(_ORIENTATIONS):
+            raise MapFileError("Invalid player orientation.")
+        layer_name, offset = _UnpackString(mm, _HEADER.size)
+        self._player = {"layer_name":layer_name, "pos":[px, py], "orientation":_ORIENTATIONS[orient]}
+        cell_bytes = _CellBytes()
+        for i in range(0, count):
+            name, offset = _UnpackString(mm, offset)
+            w, h, data_offset, targets_len = _LAYER_ENTRY.unpack_from(mm, offset)
+            offset += _LAYER_ENTRY.size
+            if data_offset + (w * h * cell_bytes) + targets_len > len(mm):
+                raise MapFileError("Layer '{}' runs past the end of the file.".format(name))
+            self._table[name] = (w, h, data_offset, targets_len)
+
+    def layer_size(self, name):
+        if name not in self._table:
+            raise MapFileError("No layer '{}' in '{}'.".format(name, self._filename))
+        return (self._table[name][0], self._table[name][1])
+
+    def read_layer(self, name):
+        """
+        Decodes and returns the named layer as a new MapLayer.
+        """
+        w, h = self.layer_size(name)
+        return self.read_region(name, 0, 0, w, h)
+
+    def read_region(self, name, x, y, w, h):
+        """
+        Decodes the w x h cells of the named layer starting at cell x, y and returns them as a new MapLayer.
+        """
+        if self._mm is None:
+            raise MapFileError("Map file '{}' is closed.".format(self._filename))
+        lw, lh = self.layer_size(name)
+        if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > lw or y + h > lh:
+            raise MapFileError("Region is outside of layer '{}'.".format(name))
+        offset = self._table[name][2]
+        region = MapLayer(w, h)
+        for attr, code, count in _FIELDS:
+            a = array(code)
+            stride = a.itemsize * count
+            if x == 0 and w == lw:
+                start = offset + (y * lw * stride)
+                a.frombytes(self._mm[start:start + (w * h * stride)])
+            else:
+                rows = []
+                for row in range(y, y + h):
+                    start = offset + (((row * lw) + x) * stride)
+                    rows.append(self._mm[start:start + (w * stride)])
+                a.frombytes(b"".join(rows))
+            if sys.byteorder != "little":
+                a.byteswap()
+            setattr(region, attr, a)
+            offset += stride * lw * lh
+        for fi, target in self._doorTargets(name).items():
+            index, face = divmod(fi, 4)
+            ty, tx = divmod(index, lw)
+            if tx >= x and tx < x + w and ty >= y and ty < y + h:
+                region.door_targets[((((ty - y) * w) + (tx - x)) * 4) + face] = target
+        return region
+
+    def _doorTargets(self, name):
+        targets = self._targets.get(name)
+        if targets is None:
+            w, h, offset, targets_len = self._table[name]
+            targets = {}
+            if targets_len > 0:
+                offset += w * h * _CellBytes()
+                for fi, target in json.loads(self._mm[offset:offset+targets_len].decode("utf-8")):
+                    targets[fi] = target
+            self._targets[name] = targets
+        return targets
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class ChunkedLayer:
+    """
+    A layer of a MapFile that decodes square chunks of cells as they're first accessed.
+    Offers the same cell interface as MapLayer. Chunks are dropped again by stream() once they're out of range,
+    unless one of their cells was changed.
+    stream() may run on another thread (see MapLayers.prefetch()), so the chunk table is only touched under _lock.
+    """
+    def __init__(self, mapfile, name, chunk_size=16):
+        if not isinstance(chunk_size, int):
+            raise TypeError("Expected integer value.")
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be greater than zero.")
+        self._mapfile = mapfile
+        self._name = name
+        self._w, self._h = mapfile.layer_size(name)
+        self._chunkSize = chunk_size
+        self._chunks = {} # (chunk x, chunk y) -> MapLayer
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    @property
+    def w(self):
+        return self._w
+
+    @property
+    def h(self):
+        return self._h
+
+    @property
+    def cell_count(self):
+        return self._w * self._h
+
+    @property
+    def chunk_size(self):
+        return self._chunkSize
+
+    @property
+    def loaded_chunks(self):
+        return len(self._chunks)
+
+    def index(self, x, y):
+        if x >= 0 and x < self._w and y >= 0 and y < self._h:
+            return (y * self._w) + x
+        return -1
+
+    def _loadChunk(self, key):
+        # Must be called with _lock held.
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            x = key[0] * self._chunkSize
+            y = key[1] * self._chunkSize
+            w = min(self._chunkSize, self._w - x)
+            h = min(self._chunkSize, self._h - y)
+            chunk = self._mapfile.read_region(self._name, x, y, w, h)
+            self._chunks[key] = chunk
+        return chunk
+
+    def _chunk(self, index, change=False):
+        """
+        Returns (chunk, index within the chunk) for a cell. If change is True, the chunk is marked as changed
+        before it's returned, so stream() can't drop it before the change is made.
+        """
+        y, x = divmod(index, self._w)
+        cs = self._chunkSize
+        key = (x // cs, y // cs)
+        with self._lock:
+            chunk = self._loadChunk(key)
+            if change:
+                self._changed.add(key)
+        return (chunk, ((y % cs) * chunk.w) + (x % cs))
+
+    def stream(self, x, y, radius):
+        """
+        Makes sure every chunk within radius chunks of cell x, y is loaded, and drops unchanged chunks further away.
+        """
+        cs = self._chunkSize
+        ccx = x // cs
+        ccy = y // cs
+        with self._lock:
+            for key in list(self._chunks.keys()):
+                if key not in self._changed and max(abs(key[0] - ccx), abs(key[1] - ccy)) > radius:
+                    del self._chunks[key]
+        for cy in range(max(0, ccy - radius), min((self._h + cs - 1) // cs, ccy + radius + 1)):
+            for cx in range(max(0, ccx - radius), min((self._w + cs - 1) // cs, ccx + radius + 1)):
+                # Locked a chunk at a time, so cell access on other threads isn't held up for the whole stream.
+                with self._lock:
+                    self._loadChunk((cx, cy))
+
+    def get_horizon(self, index):
+        chunk, i = self._chunk(index)
+        return chunk.get_horizon(i)
+
+    def set_horizon(self, index, hi):
+        chunk, i = self._chunk(index, True)
+        chunk.set_horizon(i, hi)
+
+    def get_ground(self, index):
+        chunk, i = self._chunk(index)
+        return chunk.get_ground(i)
+
+    def set_ground(self, index, gi):
+        chunk, i = self._chunk(index, True)
+        chunk.set_ground(i, gi)
+
+    def wall(self, index, face):
+        chunk, i = self._chunk(index)
+        return chunk.wall(i, face)
+
+    def set_wall(self, index, face, gi):
+        chunk, i = self._chunk(index, True)
+        chunk.set_wall(i, face, gi)
+
+    def blocked(self, index, face):
+        chunk, i = self._chunk(index)
+        return chunk.blocked(i, face)
+
+    def set_blocking(self, index, face, blocking):
+        chunk, i = self._chunk(index, True)
+        chunk.set_blocking(i, face, blocking)
+
+    def door(self, index, face):
+        chunk, i = self._chunk(index)
+        return chunk.door(i, face)
+
+    def door_target(self, index, face):
+        chunk, i = self._chunk(index)
+        return chunk.door_target(i, face)
+
+    def set_door(self, index, face, door, target=None):
+        chunk, i = self._chunk(index, True)
+        chunk.set_door(i, face, door, target)
+
+    def cell(self, index):
+        chunk, i = self._chunk(index)
+        return chunk.cell(i)
+
+    def set_cell(self, index, c):
+        chunk, i = self._chunk(index, True)
+        chunk.set_cell(i, c)
+
+    def to_layer(self):
+        """
+        Returns the whole layer, including any changes, as a new MapLayer.
+        """
+        layer = self._mapfile.read_layer(self._name)
+        cs = self._chunkSize
+        with self._lock:
+            changed = [(key, self._chunks[key]) for key in self._changed]
+        for key, chunk in changed:
+            for j in range(0, chunk.h):
+                for i in range(0, chunk.w):
+                    layer.set_cell(layer.index((key[0] * cs) + i, (key[1] * cs) + j), chunk.cell((j * chunk.w) + i))
+        return layer
+
+    def to_dict(self):
+        return self.to_layer().to_dict()
+
+
+class MapLayers(MutableMapping):
+    """
+    Dictionary of layer name -> MapLayer where the layers of a MapFile are only decoded when first accessed.
+    With a chunk_size greater than zero, layers of the file are ChunkedLayer instances instead.
+    Layers can be added, replaced, and removed like in any dictionary.
+    """
+    def __init__(self, mapfile=None, chunk_size=0):
+        self._mapfile = mapfile
+        self._chunkSize = chunk_size
+        self._layers = {}
+        self._prefetch = {}
+        if mapfile is not None:
+            for name in mapfile.layer_names:
+                self._layers[name] = None
+
+    @property
+    def decoded_count(self):
+        return len([l for l in self._layers.values() if l is not None])
+
+    def __getitem__(self, name):
+        layer = self._layers[name]
+        if layer is None:
+            if self._chunkSize > 0:
+                layer = ChunkedLayer(self._mapfile, name, self._chunkSize)
+            else:
+                layer = self._mapfile.read_layer(name)
+            self._layers[name] = layer
+        return layer
+
+    def __setitem__(self, name, layer):
+        if not isinstance(layer, (MapLayer, ChunkedLayer)):
+            raise TypeError("Expected a MapLayer or ChunkedLayer instance.")
+        self._layers[name] = layer
+
+    def __delitem__(self, name):
+        del self._layers[name]
+
+    def __contains__(self, name):
+        return name in self._layers
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def prefetch(self, name, x, y, radius):
+        """
+        Streams in the chunks around cell x, y of the named layer on a background thread.
+        Does nothing if the layer isn't chunked or is already being prefetched.
+        """
+        if name not in self._layers:
+            return
+        layer = self[name]
+        if not isinstance(layer, ChunkedLayer):
+            return
+        t = self._prefetch.get(name)
+        if t is not None and t.is_alive():
+            return
+        t = threading.Thread(target=layer.stream, args=(x, y, radius), daemon=True)
+        self._prefetch[name] = t
+        t.start()
+
+    def detach(self):
+        """
+        Decodes every remaining layer and closes the map file, so the file can be overwritten.
+        """
+        for t in self._prefetch.values():
+            t.join()
+        self._prefetch = {}
+        for name in self._layers:
+            layer = self[name]
+            if isinstance(layer, ChunkedLayer):
+                self._layers[name] = layer.to_layer()
+        if self._mapfile is not None:
+            self._mapfile.close()
+            self._mapfile = None
+
+
+def write_map(filename, layers, player):
+    """
+    Writes the given layers (name -> MapLayer) and player info ({"layer_name", "pos", "orientation"}) as a binary
+    map file. The file is written next to the destination and then moved over it.
+    """
+    if player["orientation"] not in _ORIENTATIONS:
+        raise MapFileError("Invalid player orientation '{}'.".format(player["orientation"]))
+    names = list(layers.keys())
+    head = _HEADER.pack(MAGIC, VERSION, len(names), player["pos"][0], player["pos"][1],
+                        _ORIENTATIONS.index(player["orientation"])) + _PackString(player["layer_name"])
+    offset = len(head) + sum([len(_PackString(n)) + _LAYER_ENTRY.size for n in names])
+    table = []
+    data = []
+    for name in names:
+        layer = layers[name]
+        targets = json.dumps(sorted(layer.door_targets.items())).encode("utf-8") if len(layer.door_targets) > 0 else b""
+        table.append(_PackString(name) + _LAYER_ENTRY.pack(layer.w, layer.h, offset, len(targets)))
+        for attr, code, count in _FIELDS:
+            a = getattr(layer, attr)
+            if sys.byteorder != "little":
+                a = array(code, a)
+                a.byteswap()
+            b = a.tobytes()
+            data.append(b)
+            offset += len(b)
+        data.append(targets)
+        offset += len(targets)
+
+    tmp = filename + ".tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(head)
+            f.writelines(table)
+            f.writelines(data)
+        os.replace(tmp, filename)
+    except OSError as e:
+        if os.path.isfile(tmp):
+            os.remove(tmp)
+        raise MapFileError("Failed to write '{}': {}".format(filename, e))
+
+
+def from_json(m):
+    """
+    Returns (layers, player) from map data in the "0.0.1" JSON schema.
+    """
+    if not isinstance(m, dict) or m.get("version") != JSON_VERSION:
+        raise MapFileError("Invalid map version.")
+    if "layers" not in m or "player" not in m or len(m["layers"]) != m.get("count"):
+        raise MapFileError("Invalid Map Data!")
+    try:
+        layers = {name:MapLayer.from_dict(l) for name, l in m["layers"].items()}
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError, OverflowError) as e:
+        raise MapFileError("Invalid Map Data! {}".format(e))
+    return (layers, m["player"])
+
+def to_json(layers, player):
+    """
+    Returns map data in the "0.0.1" JSON schema.
+    """
+    return {
+        "version":JSON_VERSION,
+        "count":len(layers),
+        "layers":{name:layers[name].to_dict() for name in layers},
+        "player":{
+            "layer_name":player["layer_name"],
+            "pos":(player["pos"][0], player["pos"][1]),
+            "orientation":player["orientation"]
+        }
+    }
+
+def convert(src, dst):
+    """
+    Converts the map file src into dst. Files ending in EXTENSION are binary, anything else is JSON.
+    """
+    if src.endswith(EXTENSION):
+        mf = MapFile(src)
+        try:
+            layers = MapLayers(mf)
+            layers.detach()
+            player = mf.player
+        finally:
+            mf.close()
+    else:
+        with open(src) as f:
+            layers, player = from_json(json.load(f))
+    if dst.endswith(EXTENSION):
+        write_map(dst, layers, player)
+    else:
+        gbe.resourceLoaders.save_JSON(dst, to_json(layers, player))
+
+
+def load_map_file(filename, params={}):
+    if not os.path.isfile(filename):
+        raise MapFileError("File '{}' is missing or not a file.".format(filename))
+    return MapFile(filename)
+
+def save_map_file(filename, data):
+    write_map(filename, data["layers"], data["player"])
+
+
+gbe.resource.define_resource_type("bin_maps", "data/maps/", load_map_file)
+gbe.resource.define_resource_type("user_bin_maps", "maps/", load_map_file, save_map_file)
+
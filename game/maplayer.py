@@ -0,0 +1,123 @@
+from array import array
+
+
+# Face order matches the orientation numbering used by NodeGameMap (see NodeGameMap._d_s2n()).
+FACES = ("n", "e", "s", "w")
+
+
+class MapLayer:
+    """
+    Compact, struct-of-arrays storage for a single map layer.
+    Every cell is a flat index ((y * w) + x). Per cell values are stored in one array each, and per face values
+    in arrays of four entries per cell ((index * 4) + face). Door targets are rare, so they're kept in a dictionary.
+    """
+    def __init__(self, w, h):
+        if not isinstance(w, int) or not isinstance(h, int):
+            raise TypeError("Expected integer values.")
+        if w <= 0 or h <= 0:
+            raise ValueError("Layer width and height must be greater than zero.")
+        count = w * h
+        self._w = w
+        self._h = h
+        self.horizon = array("h", [0]) * count
+        self.ground = array("h", [0]) * count
+        self.walls = array("h", [-1]) * (count * 4) # Wall graphic index. -1 = None
+        self.blocking = array("B", [0]) * count # One bit per face.
+        self.doors = array("b", [-1]) * (count * 4) # -1 = None, 0 = Closed, 1 = Open
+        self.door_targets = {} # (index * 4) + face -> door target
+
+    @property
+    def w(self):
+        return self._w
+
+    @property
+    def h(self):
+        return self._h
+
+    @property
+    def cell_count(self):
+        return self._w * self._h
+
+    def index(self, x, y):
+        if x >= 0 and x < self._w and y >= 0 and y < self._h:
+            return (y * self._w) + x
+        return -1
+
+    def get_horizon(self, index):
+        return self.horizon[index]
+
+    def set_horizon(self, index, hi):
+        self.horizon[index] = hi
+
+    def get_ground(self, index):
+        return self.ground[index]
+
+    def set_ground(self, index, gi):
+        self.ground[index] = gi
+
+    def wall(self, index, face):
+        return self.walls[(index * 4) + face]
+
+    def set_wall(self, index, face, gi):
+        self.walls[(index * 4) + face] = gi
+
+    def blocked(self, index, face):
+        return (self.blocking[index] >> face) & 1 == 1
+
+    def set_blocking(self, index, face, blocking):
+        if blocking == True:
+            self.blocking[index] |= (1 << face)
+        else:
+            self.blocking[index] &= ~(1 << face) & 0xF
+
+    def door(self, index, face):
+        return self.doors[(index * 4) + face]
+
+    def door_target(self, index, face):
+        return self.door_targets.get((index * 4) + face)
+
+    def set_door(self, index, face, door, target=None):
+        fi = (index * 4) + face
+        self.doors[fi] = door
+        if target is None:
+            self.door_targets.pop(fi, None)
+        else:
+            self.door_targets[fi] = target
+
+    def cell(self, index):
+        """
+        Returns a copy of the cell at index in the dictionary form used by the JSON map format.
+        """
+        c = {"h":self.horizon[index], "g":self.ground[index]}
+        for face in range(0, 4):
+            c[FACES[face]] = [self.wall(index, face), self.blocked(index, face), self.door(index, face), self.door_target(index, face)]
+        return c
+
+    def set_cell(self, index, c):
+        """
+        Sets the cell at index from the dictionary form used by the JSON map format.
+        """
+        self.horizon[index] = c["h"]
+        self.ground[index] = c["g"]
+        for face in range(0, 4):
+            f = c[FACES[face]]
+            self.set_wall(index, face, f[0])
+            self.set_blocking(index, face, f[1])
+            self.set_door(index, face, f[2], f[3])
+
+    def to_dict(self):
+        return {
+            "w":self._w,
+            "h":self._h,
+            "cells":[self.cell(i) for i in range(0, self.cell_count)]
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        layer = cls(d["w"], d["h"])
+        cells = d["cells"]
+        if len(cells) != layer.cell_count:
+            raise ValueError("Layer cell count does not match its size.")
+        for i in range(0, len(cells)):
+            layer.set_cell(i, cells[i])
+        return layer
@@ -1,8 +1,47 @@
 import random
+from collections import OrderedDict
 from . import gbe
+from .maplayer import MapLayer
+from . import mapfile
 import pygame
 
 
+# Orientation lookups. Index order matches NodeGameMap._d_s2n() / _d_n2s().
+_ORIENT_NAMES = ("n", "e", "s", "w")
+_ORIENT_VECS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+def _BuildViewCone():
+    """
+    Builds, for each orientation, the list of (dx, dy, depth, slot) offsets of every cell the perspective
+    renderer can see. Depth 0 is the viewer's own cell, slot < 0 is left of the viewer, slot > 0 is right.
+    """
+    cone = []
+    for fvec in _ORIENT_VECS:
+        lvec = (fvec[1], -fvec[0])
+        entries = []
+        for depth, reach in ((2, 2), (1, 1), (0, 1)):
+            for slot in range(-reach, reach+1):
+                dx = (fvec[0] * depth) - (lvec[0] * slot)
+                dy = (fvec[1] * depth) - (lvec[1] * slot)
+                entries.append((dx, dy, depth, slot))
+        cone.append(tuple(entries))
+    return tuple(cone)
+_VIEW_CONE = _BuildViewCone()
+
+# The (front, left, right) wall face indices seen by the viewer for each orientation.
+_VIEW_FACES = tuple((o, (o+3)%4, (o+1)%4) for o in range(0, 4))
+
+
+def _MirrorSurface(surf):
+    return pygame.transform.flip(surf, True, False)
+
+def _MirrorRect(rect, msurf):
+    """
+    Returns the rect within the horizontally mirrored surface msurf that holds the mirror image of rect.
+    """
+    return (msurf.get_width() - (rect[0] + rect[2]), rect[1], rect[2], rect[3])
+
+
 class NodeOptions(gbe.nodes.Node2D):
     def __init__(self, name="Options", parent=None):
         try:
@@ -34,31 +73,42 @@ class NodeOptions(gbe.nodes.Node2D):
         self._options.append([nodeOption, event, params])
 
     def on_start(self):
-        self.listen("KEYPRESSED", self.on_keypressed)
+        self.listen("ACTION", self.on_action)
 
     def on_pause(self):
-        self.unlisten("KEYPRESSED", self.on_keypressed)
+        self.unlisten("ACTION", self.on_action)
+
+    def on_action(self, event, params):
+        handler = self._ACTIONS.get(params["action"])
+        if handler is not None:
+            handler(self)
 
-    def on_keypressed(self, event, params):
-        if params["key_name"] == "w":
-            if self._oindex > 0:
-                self._options[self._oindex][0].set_color(*self._color_idle)
-                self._oindex -= 1
-                self._options[self._oindex][0].set_color(*self._color_select)
+    def _menuUp(self):
+        if self._oindex > 0:
+            self._options[self._oindex][0].set_color(*self._color_idle)
+            self._oindex -= 1
+            self._options[self._oindex][0].set_color(*self._color_select)
 
-        elif params["key_name"] == "s":
-            if self._oindex < len(self._options) - 1:
-                self._options[self._oindex][0].set_color(*self._color_idle)
-                self._oindex += 1
-                self._options[self._oindex][0].set_color(*self._color_select)
+    def _menuDown(self):
+        if self._oindex < len(self._options) - 1:
+            self._options[self._oindex][0].set_color(*self._color_idle)
+            self._oindex += 1
+            self._options[self._oindex][0].set_color(*self._color_select)
 
-        elif params["key_name"] in ["enter", "return"]:
-            if len(self._options) > 0:
-                op = self._options[self._oindex]
-                self.emit(op[1], op[2])
+    def _menuSelect(self):
+        if len(self._options) > 0:
+            op = self._options[self._oindex]
+            self.emit(op[1], op[2])
 
-        elif params["key_name"] == "escape":
-            self.emit("QUIT")
+    def _menuBack(self):
+        self.emit("QUIT")
+
+    _ACTIONS = {
+        "menu_up":_menuUp,
+        "menu_down":_menuDown,
+        "menu_select":_menuSelect,
+        "menu_back":_menuBack
+    }
 
 
 
@@ -69,7 +119,7 @@ class NodeGameMap(gbe.nodes.Node2D):
         except gbe.nodes.NodeError as e:
             raise e
         self._renderMode = 0 # 0 = Top-down | 1 = Perspective
-        self._layer = {}
+        self._layer = {} # name -> MapLayer
         self._currentLayer = ""
         self._res = {
             "env_src":"",
@@ -88,6 +138,22 @@ class NodeGameMap(gbe.nodes.Node2D):
         }
         self._cellpos = [0,0]
         self._orientation = "n"
+        self._view = {} # (depth, slot) -> cell index for the current position and orientation.
+        self._viewFaces = _VIEW_FACES[0]
+        self._blitCache = OrderedDict() # (layer, x, y, orientation) -> list of perspective view blits.
+        self._blitCacheInfo = None
+        self._blitCacheLimit = 4096 # Entries. Least recently used views are dropped past this.
+        self._frameCache = {
+            "frames":OrderedDict(), # (layer, x, y, orientation) -> fully composed view surface.
+            "bytes":0,
+            "limit":1048576, # Bytes. 0 disables the frame cache.
+            "hits":0,
+            "misses":0
+        }
+        self._stream = {
+            "chunk_size":16, # Cells square. 0 loads binary map layers whole.
+            "radius":2 # Chunks kept loaded around the viewer.
+        }
 
     @property
     def environment_source(self):
@@ -108,13 +174,13 @@ class NodeGameMap(gbe.nodes.Node2D):
     @property
     def current_layer_width(self):
         if self._currentLayer != "":
-            return self._layer[self._currentLayer]["w"]
+            return self._layer[self._currentLayer].w
         return 0
 
     @property
     def current_layer_height(self):
         if self._currentLayer != "":
-            return self._layer[self._currentLayer]["h"]
+            return self._layer[self._currentLayer].h
         return 0
 
     @property
@@ -132,55 +198,142 @@ class NodeGameMap(gbe.nodes.Node2D):
     def cell_position(self):
         return (self._cellpos[0], self._cellpos[1])
 
+    @property
+    def frame_cache_limit(self):
+        return self._frameCache["limit"]
+    @frame_cache_limit.setter
+    def frame_cache_limit(self, limit):
+        if not isinstance(limit, int):
+            raise TypeError("Expected integer value.")
+        if limit < 0:
+            raise ValueError("Limit must be zero or greater.")
+        self._frameCache["limit"] = limit
+        self._trimFrameCache()
+
+    @property
+    def blit_cache_limit(self):
+        return self._blitCacheLimit
+    @blit_cache_limit.setter
+    def blit_cache_limit(self, limit):
+        if not isinstance(limit, int):
+            raise TypeError("Expected integer value.")
+        if limit < 0:
+            raise ValueError("Limit must be zero or greater.")
+        self._blitCacheLimit = limit
+        self._trimBlitCache()
+
+    @property
+    def frame_cache_stats(self):
+        fc = self._frameCache
+        return {
+            "hits":fc["hits"],
+            "misses":fc["misses"],
+            "frames":len(fc["frames"]),
+            "bytes":fc["bytes"],
+            "limit":fc["limit"]
+        }
+
+    def reset_frame_cache_stats(self):
+        self._frameCache["hits"] = 0
+        self._frameCache["misses"] = 0
+
+    @property
+    def stream_chunk_size(self):
+        """
+        Size, in cells, of the square chunks binary map layers are streamed in. Takes effect on the next load_map().
+        """
+        return self._stream["chunk_size"]
+    @stream_chunk_size.setter
+    def stream_chunk_size(self, size):
+        if not isinstance(size, int):
+            raise TypeError("Expected integer value.")
+        if size < 0:
+            raise ValueError("Chunk size cannot be negative.")
+        self._stream["chunk_size"] = size
+
+    @property
+    def stream_radius(self):
+        return self._stream["radius"]
+    @stream_radius.setter
+    def stream_radius(self, radius):
+        if not isinstance(radius, int):
+            raise TypeError("Expected integer value.")
+        if radius < 1:
+            raise ValueError("Stream radius must be at least one chunk.")
+        self._stream["radius"] = radius
+        self._streamView()
+
 
     def load_map(self, src, user=True):
+        """
+        Loads the map src. Sources ending in mapfile.EXTENSION are binary map files, anything else is JSON.
+        """
+        if src.endswith(mapfile.EXTENSION):
+            self._loadBinaryMap(src, user)
+            return
         rtype = "maps"
         if user == True:
             rtype = "user_maps"
         rm = self.resource
-        m = None
         try:
             m = rm.load(rtype, src)
             m = m.data
         except Exception as e:
             print ("Failed to load '{}': {}".format(src, e))
-
-        if "version" not in m:
-            print("Invalid Map Data!")
-            return
-        if m["version"] != "0.0.1":
-            print ("Invalid map version.")
             return
-        if "count" not in m:
-            print("Invalid Map Data!")
-            return
-        if not isinstance(m["count"], int):
-            print("Invalid Map Data!")
-            return
-        if "layers" not in m:
-            print ("Invalid Map Data!")
-            return
-        if len(m["layers"]) != m["count"]:
-            print ("Map Layer count mismatch!")
-            return
-        if "player" not in m:
-            print ("Invalid Map Data!")
+        try:
+            layers, player = mapfile.from_json(m)
+        except mapfile.MapFileError as e:
+            print (e)
             return
-        # OK... these are weak tests, but we'll just accept it from here!
-        self._layer = m["layers"]
-        self._currentLayer = m["player"]["layer_name"]
-        self._cellpos = m["player"]["pos"]
-        self._orientation = m["player"]["orientation"]
+        self._setMap(layers, player)
+        print("Map '{}' loaded!".format(src))
 
+    def _loadBinaryMap(self, src, user):
+        rtype = "bin_maps"
+        if user == True:
+            rtype = "user_bin_maps"
+        try:
+            mf = self.resource.load(rtype, src)
+        except Exception as e:
+            print ("Failed to load '{}': {}".format(src, e))
+            return
+        self._setMap(mapfile.MapLayers(mf, self._stream["chunk_size"]), mf.player)
         print("Map '{}' loaded!".format(src))
 
+    def _setMap(self, layers, player):
+        self._layer = layers
+        self._currentLayer = player["layer_name"]
+        self._cellpos = player["pos"]
+        self._orientation = player["orientation"]
+        self._invalidateAll()
+        self._updateView()
+
 
     def save_map(self, dst):
+        """
+        Saves the map to the user maps as dst. Destinations ending in mapfile.EXTENSION are saved as binary map files,
+        anything else as JSON.
+        """
         rm = self.resource
+        if dst.endswith(mapfile.EXTENSION):
+            if isinstance(self._layer, mapfile.MapLayers):
+                self._layer.detach() # The file being mapped may be the one being written.
+            m = {
+                "layers":self._layer,
+                "player":{"layer_name":self._currentLayer, "pos":self._cellpos, "orientation":self._orientation}
+            }
+            try:
+                rm.save("user_bin_maps", dst, m)
+            except Exception as e:
+                print("Failed to save '{}': {}".format(dst, e))
+                return
+            print ("Map '{}' saved.".format(dst))
+            return
         m = {
             "version":"0.0.1",
             "count":self.layer_count,
-            "layers":self._layer,
+            "layers":{name:layer.to_dict() for name, layer in self._layer.items()},
             "player":{
                 "layer_name":self._currentLayer,
                 "pos":(self._cellpos[0], self._cellpos[1]),
@@ -205,6 +358,7 @@ class NodeGameMap(gbe.nodes.Node2D):
                 if e is not None and e() is not None:
                     self._res["env_src"] = env_src
                     self._res["env"] = e
+                    self._invalidateAll()
                     # NOTE: Making a lot of assumptions to the structural validity of the data file.
                     isrc1 = e().data["horizon"]["src"]
                     isrc2 = e().data["ground"]["src"]
@@ -222,6 +376,7 @@ class NodeGameMap(gbe.nodes.Node2D):
                 if w is not None and w() is not None:
                     self._res["wall_src"] = wall_src
                     self._res["walls"] = w
+                    self._invalidateAll()
                     # NOTE: I'm making a lot of assumptions to the structural validity of the data file, but...
                     imgsrc = w().data["src"]
                     if res.is_valid("graphic", imgsrc):
@@ -236,42 +391,30 @@ class NodeGameMap(gbe.nodes.Node2D):
     def add_layer(self, name, w, h):
         if name == "" or name in self._layer:
             return
-        self._layer[name] = {
-            "w":w,
-            "h":h,
-            "cells":[]
-        }
-        for c in range(0, w*h):
-            self._layer[name]["cells"].append({
-                "h":0, # Horizon
-                "g":0, # Ground
-                "n":[-1, False, -1, None], # North Wall | [<graphic index, -1 = None>, <blocking>, <door index, -1 = None, 0 = closed, 1=open>, <door target>]
-                "s":[-1, False, -1, None], # South Wall
-                "e":[-1, False, -1, None], # East Wall
-                "w":[-1, False, -1, None], # West Wall
-            })
+        self._layer[name] = MapLayer(w, h)
         if self._currentLayer == "":
             self._currentLayer = name
+            self._updateView()
 
     def set_active_layer(self, name, x=0, y=0):
-        if name == "" or not (name in self._layers):
+        if name == "" or not (name in self._layer):
             return
-        layer = self._layers[name]
-        if x >= 0 and x < layer["w"] and y >= 0 and y < layer["h"]:
+        if self._layer[name].index(x, y) >= 0:
             self._currentLayer = name
             self._cellpos = [x,y]
+            self._updateView()
 
     def set_cell_env(self, x, y, ceiling=-1, ground=-1):
         if self._currentLayer == "":
             return
         layer = self._layer[self._currentLayer]
-        if x >= 0 and x < layer["w"] and y >= 0 and y < layer["h"]:
-            index = (y * layer["w"]) + x
-            cell = layer["cells"]
+        index = layer.index(x, y)
+        if index >= 0:
             if ceiling >= 0:
-                cell[index]["c"] = ceiling
+                layer.set_horizon(index, ceiling)
             if ground >= 0:
-                cell[index]["g"] = ground
+                layer.set_ground(index, ground)
+            self._invalidateCell(x, y)
 
     def fill_cell_env(self, x1, y1, x2, y2, ceiling=-1, ground=-1):
         if self._currentLayer == "":
@@ -284,23 +427,21 @@ class NodeGameMap(gbe.nodes.Node2D):
         if self._currentLayer == "" or not (face == "n" or face == "s" or face == "w" or face == "e"):
             return
         layer = self._layer[self._currentLayer]
-        if x >= 0 and x < layer["w"] and y >= 0 and y < layer["h"]:
-            index = (y * layer["w"]) + x
-            cell = layer["cells"]
+        index = layer.index(x, y)
+        if index >= 0:
+            f = self._d_s2n(face)
             if gi <= -2:
                 gi = self._res["wall_index"]
             if gi >= -1:
-                cell[index][face][0] = gi
+                layer.set_wall(index, f, gi)
                 if blocking is not None:
-                    cell[index][face][1] = (blocking == True)
+                    layer.set_blocking(index, f, blocking)
                 else:
-                    if gi == -1: # If gi = -1, there is no wall, so, by default, there is no blocking.
-                        cell[index][face][1] = False
-                    else: # Otherwise, blocking is assumed :)
-                        cell[index][face][1] = True
+                    # If gi = -1, there is no wall, so, by default, there is no blocking. Otherwise, blocking is assumed :)
+                    layer.set_blocking(index, f, gi != -1)
             elif blocking is not None:
-                blocking = (blocking == True) # Forcing a boolean
-                cell[index][face][1] = blocking  
+                layer.set_blocking(index, f, blocking)
+            self._invalidateCell(x, y)
 
     def next_wall(self):
         if self._res["walls"] is not None:
@@ -328,6 +469,7 @@ class NodeGameMap(gbe.nodes.Node2D):
         if onum < 0:
             onum = 3
         self._orientation = self._d_n2s(onum)
+        self._updateView()
 
     def turn_right(self):
         onum = self._d_s2n(self._orientation)
@@ -335,10 +477,12 @@ class NodeGameMap(gbe.nodes.Node2D):
         if onum > 3:
             onum = 0
         self._orientation = self._d_n2s(onum)
+        self._updateView()
 
     def move_to(self, x, y):
         if x >= 0 and x < self.current_layer_width and y >= 0 and y < self.current_layer_height:
             self._cellpos = [x, y]
+            self._updateView()
 
     def move_forward(self, ignore_passible=False):
         if ignore_passible or self.is_passible(self._cellpos[0], self._cellpos[1], self._orientation):
@@ -368,6 +512,7 @@ class NodeGameMap(gbe.nodes.Node2D):
             self._orientation = "e"
         res = self.move_forward(ignore_passible)
         self._orientation = orient
+        self._updateView()
         return res
 
     def is_passible(self, x, y, d):
@@ -378,10 +523,9 @@ class NodeGameMap(gbe.nodes.Node2D):
         if self._currentLayer == "" or d < 0 or d >= 4:
             return False
         layer = self._layer[self._currentLayer]
-        if x >= 0 and x < layer["w"] and y >= 0 and y < layer["h"]:
-            index = (y * layer["w"]) + x
-            d = self._d_n2s(d)
-            return not layer["cells"][index][d][1]
+        index = layer.index(x, y)
+        if index >= 0:
+            return not layer.blocked(index, d)
         return False
 
 
@@ -390,12 +534,14 @@ class NodeGameMap(gbe.nodes.Node2D):
             self._renderMode = 1
         else:
             self._renderMode = 0
+        self.mark_dirty()
 
     def set_render_mode(self, mode):
         if mode <= 0:
             self._renderMode = 0
         else:
             self._renderMode = 1
+        self.mark_dirty()
 
     def get_render_mode(self):
         return self._renderMode
@@ -428,9 +574,13 @@ class NodeGameMap(gbe.nodes.Node2D):
         return -1
 
     def _getCell(self, x, y):
-        if x >=- 0 and x < self.current_layer_width and y >= 0 and y < self.current_layer_height:
-            index = self._indexFromPos(x, y)
-            return self._layer[self._currentLayer]["cells"][index]
+        """
+        Returns a copy of the cell at x, y of the current layer in the map file's dictionary form.
+        Changes to the returned cell are not stored. Use set_cell_env() and set_cell_face() for that.
+        """
+        index = self._indexFromPos(x, y)
+        if index >= 0:
+            return self._layer[self._currentLayer].cell(index)
         return None
 
     def _getOrientVec(self):
@@ -449,7 +599,8 @@ class NodeGameMap(gbe.nodes.Node2D):
         cell_size = self._topdown["size"]
         size = self.resolution
         pos = self._cellpos
-        lsize = (self.current_layer_width, self.current_layer_height)
+        layer = self._layer[self._currentLayer]
+        lsize = (layer.w, layer.h)
         hcells = int(size[0] / cell_size)
         vcells = int(size[1] / cell_size)
         cx = pos[0] - int(hcells * 0.5)
@@ -462,223 +613,284 @@ class NodeGameMap(gbe.nodes.Node2D):
                 for i in range(0, hcells+1):
                     x = cx + i
                     if x >= 0 and x < lsize[0]:
-                        cell = self._getCell(x, y)
-                        if cell["n"][0] >= 0:
+                        index = (y * lsize[0]) + x
+                        if layer.wall(index, 0) >= 0:
                             self.draw_rect((rx, ry, cell_size, 2), self._topdown["wall_color"], 0, self._topdown["wall_color"])
-                        if cell["e"][0] >= 0:
+                        if layer.wall(index, 1) >= 0:
                             self.draw_rect((rx+(cell_size-2), ry, 2, cell_size), self._topdown["wall_color"], 0, self._topdown["wall_color"])
-                        if cell["s"][0] >= 0:
+                        if layer.wall(index, 2) >= 0:
                             self.draw_rect((rx, ry+(cell_size-2), cell_size, 2), self._topdown["wall_color"], 0, self._topdown["wall_color"])
-                        if cell["w"][0] >= 0:
+                        if layer.wall(index, 3) >= 0:
                             self.draw_rect((rx, ry, 2, cell_size), self._topdown["wall_color"], 0, self._topdown["wall_color"])
 
-                        if cell["n"][1] == True:
+                        if layer.blocked(index, 0):
                             self.draw_lines([(rx+1, ry+1), (rx+(cell_size-2), ry+1)], self._topdown["blocked_color"], 1)
-                        if cell["e"][1] == True:
+                        if layer.blocked(index, 1):
                             self.draw_lines([(rx+(cell_size-2), ry+1), (rx+(cell_size-2), ry+(cell_size-2))], self._topdown["blocked_color"], 1)
-                        if cell["s"][1] == True:
+                        if layer.blocked(index, 2):
                             self.draw_lines([(rx+1, ry+(cell_size-2)), (rx+(cell_size-2), ry+(cell_size-2))], self._topdown["blocked_color"], 1)
-                        if cell["w"][1] == True:
+                        if layer.blocked(index, 3):
                             self.draw_lines([(rx+1, ry+1), (rx+1, ry+(cell_size-2))], self._topdown["blocked_color"], 1)
                     rx += cell_size    
             ry += cell_size
 
 
 
-    def _RenderPersFar(self, pos, size, o, orr, orl, wdat, wsurf):
-        ovec = self._getOrientVec()
-        fx = pos[0] + (ovec[0]*2)
-        fy = pos[1] + (ovec[1]*2)
-        fcell = self._getCell(fx, fy)
-        if fcell == None:
+    def _updateView(self):
+        """
+        Resolves the view cone of the current position and orientation into flat cell indices.
+        Called whenever the viewer moves, turns, or changes layers, so rendering never has to.
+        """
+        self.mark_dirty()
+        self._view = {}
+        onum = self._d_s2n(self._orientation)
+        if self._currentLayer == "" or onum < 0:
+            return
+        self._viewFaces = _VIEW_FACES[onum]
+        layer = self._layer[self._currentLayer]
+        w = layer.w
+        h = layer.h
+        px = self._cellpos[0]
+        py = self._cellpos[1]
+        for dx, dy, depth, slot in _VIEW_CONE[onum]:
+            x = px + dx
+            y = py + dy
+            if x >= 0 and x < w and y >= 0 and y < h:
+                self._view[(depth, slot)] = (y * w) + x
+        self._streamView()
+
+    def _streamView(self):
+        """
+        Keeps the chunks around the viewer loaded and prefetches the area behind any door in view that leads
+        to another layer. Door targets are either a layer name (same position) or [layer name, x, y].
+        """
+        if self._currentLayer == "":
+            return
+        layer = self._layer[self._currentLayer]
+        if isinstance(layer, mapfile.ChunkedLayer):
+            layer.stream(self._cellpos[0], self._cellpos[1], self._stream["radius"])
+        if not isinstance(self._layer, mapfile.MapLayers):
+            return
+        for index in self._view.values():
+            for face in range(0, 4):
+                target = layer.door_target(index, face)
+                if target is None:
+                    continue
+                if isinstance(target, str):
+                    target = [target, self._cellpos[0], self._cellpos[1]]
+                if isinstance(target, (list, tuple)) and len(target) >= 3 and isinstance(target[0], str) and target[0] != self._currentLayer:
+                    self._layer.prefetch(target[0], target[1], target[2], self._stream["radius"])
+
+    def _getViewCell(self, depth, slot):
+        """
+        Returns the index, within the current layer, of the cell at depth and slot of the view cone, or -1.
+        """
+        return self._view.get((depth, slot), -1)
+
+    def _invalidateCell(self, x, y):
+        """
+        Drops every cached perspective view that has the cell at x, y of the current layer in its view cone.
+        """
+        self.mark_dirty()
+        fc = self._frameCache
+        if len(self._blitCache) <= 0 and len(fc["frames"]) <= 0:
+            return
+        for onum in range(0, 4):
+            o = _ORIENT_NAMES[onum]
+            for dx, dy, depth, slot in _VIEW_CONE[onum]:
+                key = (self._currentLayer, x - dx, y - dy, o)
+                self._blitCache.pop(key, None)
+                frame = fc["frames"].pop(key, None)
+                if frame is not None:
+                    fc["bytes"] -= frame.get_width() * frame.get_height() * frame.get_bytesize()
+
+    def _invalidateAll(self):
+        self.mark_dirty()
+        self._blitCache = OrderedDict()
+        self._frameCache["frames"] = OrderedDict()
+        self._frameCache["bytes"] = 0
+
+    def _trimBlitCache(self):
+        while len(self._blitCache) > self._blitCacheLimit:
+            self._blitCache.popitem(last=False)
+
+    def _trimFrameCache(self):
+        fc = self._frameCache
+        frames = fc["frames"]
+        while fc["bytes"] > fc["limit"] and len(frames) > 0:
+            key, surf = frames.popitem(last=False)
+            fc["bytes"] -= surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+    def _RenderPersFar(self, blits, size, layer, wdat, wsurf, lwsurf):
+        o, orl, orr = self._viewFaces
+        fcell = self._getViewCell(2, 0)
+        if fcell < 0:
             return # If we can't see the cell directly ahead, the other's won't be visible either!
 
-        lcell = llcell = rcell = rrcell = None
-        if ovec[0] == 0: # Facing North/South
-            lcell = self._getCell(fx + ovec[1], fy)
-            llcell = self._getCell(fx + (ovec[1]*2), fy)
-            rcell = self._getCell(fx - ovec[1], fy)
-            rrcell = self._getCell(fx - (ovec[1]*2), fy)
-        else: # Facing East/West
-            lcell = self._getCell(fx, fy - ovec[0])
-            llcell = self._getCell(fx, fy - (ovec[0]*2))
-            rcell = self._getCell(fx, fy + ovec[0])
-            rrcell = self._getCell(fx, fy + (ovec[0]*2))
+        lcell = self._getViewCell(2, -1)
+        llcell = self._getViewCell(2, -2)
+        rcell = self._getViewCell(2, 1)
+        rrcell = self._getViewCell(2, 2)
 
         hsw = int(size[0]*0.5)
         hsh = int(size[1]*0.5)
 
         # Rendering from edges to center
-        if llcell is not None:
-            if llcell[o][0] >= 0:
-                rect = wdat["walls"][llcell[o][0]]["f_far"]
+        if llcell >= 0:
+            if layer.wall(llcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(llcell, o)]["f_far"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (0, hsh-hh), (rect[0], rect[1], hw, rect[3]))
-        if rrcell is not None:
-            if rrcell[o][0] >= 0:
-                rect = wdat["walls"][rrcell[o][0]]["f_far"]
+                blits.append((wsurf, (0, hsh-hh), (rect[0], rect[1], hw, rect[3])))
+        if rrcell >= 0:
+            if layer.wall(rrcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(rrcell, o)]["f_far"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (size[0]-hw, hsh-hh), (rect[0]+hw, rect[1], hw, rect[3]))
-        if lcell is not None:
-            if lcell[o][0] >= 0:
-                rect = wdat["walls"][lcell[o][0]]["f_far"]
+                blits.append((wsurf, (size[0]-hw, hsh-hh), (rect[0]+hw, rect[1], hw, rect[3])))
+        if lcell >= 0:
+            if layer.wall(lcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(lcell, o)]["f_far"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (hw, hsh-hh), (rect[0], rect[1], rect[2], rect[3]))
-            if lcell[orl][0] >= 0:
-                rect = wdat["walls"][lcell[orl][0]]["s_far"]
-                lsurf = pygame.transform.flip(wsurf.subsurface(rect), True, False)
+                blits.append((wsurf, (hw, hsh-hh), (rect[0], rect[1], rect[2], rect[3])))
+            if layer.wall(lcell, orl) >= 0:
+                rect = wdat["walls"][layer.wall(lcell, orl)]["s_far"]
                 hh = int(rect[3]*0.5)
-                self.draw_image(lsurf, (0, hsh-hh))
-        if rcell is not None:
-            if rcell[o][0] >= 0:
-                rect = wdat["walls"][rcell[o][0]]["f_far"]
+                blits.append((lwsurf, (0, hsh-hh), _MirrorRect(rect, lwsurf)))
+        if rcell >= 0:
+            if layer.wall(rcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(rcell, o)]["f_far"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (size[0]-(rect[2]+hw), hsh-hh), (rect[0], rect[1], rect[2], rect[3]))
-            if rcell[orr][0] >= 0:
-                rect = wdat["walls"][rcell[orr][0]]["s_far"]
+                blits.append((wsurf, (size[0]-(rect[2]+hw), hsh-hh), (rect[0], rect[1], rect[2], rect[3])))
+            if layer.wall(rcell, orr) >= 0:
+                rect = wdat["walls"][layer.wall(rcell, orr)]["s_far"]
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (size[0]-rect[2], hsh-hh), (rect[0], rect[1], rect[2], rect[3]))
+                blits.append((wsurf, (size[0]-rect[2], hsh-hh), (rect[0], rect[1], rect[2], rect[3])))
 
         # Rendering the main cell!!
         frect = None # This will be used to place walls
-        if fcell[o][0] >= 0:
-            frect = wdat["walls"][fcell[o][0]]["f_far"]
+        if layer.wall(fcell, o) >= 0:
+            frect = wdat["walls"][layer.wall(fcell, o)]["f_far"]
             hw = int(frect[2]*0.5)
             hh = int(frect[3]*0.5)
-            self.draw_image(wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3]))
-        if fcell[orl][0] >= 0:
-            rect = wdat["walls"][fcell[orl][0]]["s_far"]
+            blits.append((wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3])))
+        if layer.wall(fcell, orl) >= 0:
+            rect = wdat["walls"][layer.wall(fcell, orl)]["s_far"]
             if frect is None:
                 # Kinda cheating in that it's known that all walls are the same size.
-                frect = wdat["walls"][fcell[orl][0]]["f_far"]
+                frect = wdat["walls"][layer.wall(fcell, orl)]["f_far"]
             hw = int(frect[2]*0.5)
-            lsurf = pygame.transform.flip(wsurf.subsurface(rect), True, False)
-            self.draw_image(lsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)))
-        if fcell[orr][0] >= 0:
-            rect = wdat["walls"][fcell[orr][0]]["s_far"]
+            blits.append((lwsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)), _MirrorRect(rect, lwsurf)))
+        if layer.wall(fcell, orr) >= 0:
+            rect = wdat["walls"][layer.wall(fcell, orr)]["s_far"]
             if frect is None:
-                frect = wdat["walls"][fcell[orr][0]]["f_far"]
+                frect = wdat["walls"][layer.wall(fcell, orr)]["f_far"]
             hw = int(frect[2]*0.5)
-            self.draw_image(wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3]))
+            blits.append((wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3])))
 
 
-    def _RenderPersMid(self, pos, size, o, orr, orl, wdat, wsurf):
-        ovec = self._getOrientVec()
-        fx = pos[0] + ovec[0]
-        fy = pos[1] + ovec[1]
-        fcell = self._getCell(fx, fy)
-        if fcell == None:
+    def _RenderPersMid(self, blits, size, layer, wdat, wsurf, lwsurf):
+        o, orl, orr = self._viewFaces
+        fcell = self._getViewCell(1, 0)
+        if fcell < 0:
             return # If we can't see the cell directly ahead, the other's won't be visible either!
 
-        lcell = rcell = None
-        if ovec[0] == 0: # Facing North/South
-            lcell = self._getCell(fx + ovec[1], fy)
-            rcell = self._getCell(fx - ovec[1], fy)
-        else: # Facing East/West
-            lcell = self._getCell(fx, fy - ovec[0])
-            rcell = self._getCell(fx, fy + ovec[0])
+        lcell = self._getViewCell(1, -1)
+        rcell = self._getViewCell(1, 1)
 
         hsw = int(size[0]*0.5)
         hsh = int(size[1]*0.5)
 
         # Render from outside inwards!
-        if lcell is not None:
-            if lcell[o][0] >= 0:
-                rect = wdat["walls"][lcell[o][0]]["f_mid"]
+        if lcell >= 0:
+            if layer.wall(lcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(lcell, o)]["f_mid"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (0, hsh-hh), (rect[0]+hw, rect[1], int(rect[2]*0.5), rect[3])) 
-        if rcell is not None:
-            if rcell[o][0] >= 0:
-                rect = wdat["walls"][rcell[o][0]]["f_mid"]
+                blits.append((wsurf, (0, hsh-hh), (rect[0]+hw, rect[1], int(rect[2]*0.5), rect[3])))
+        if rcell >= 0:
+            if layer.wall(rcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(rcell, o)]["f_mid"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
-                self.draw_image(wsurf, (size[0]-hw, hsh-hh), (rect[0], rect[1], hw, rect[3]))
+                blits.append((wsurf, (size[0]-hw, hsh-hh), (rect[0], rect[1], hw, rect[3])))
 
         # Rendering the main cell!!
         frect = None # This will be used to place walls
-        if fcell[o][0] >= 0:
-            frect = wdat["walls"][fcell[o][0]]["f_mid"]
+        if layer.wall(fcell, o) >= 0:
+            frect = wdat["walls"][layer.wall(fcell, o)]["f_mid"]
             hw = int(frect[2]*0.5)
             hh = int(frect[3]*0.5)
-            self.draw_image(wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3]))
-        if fcell[orl][0] >= 0:
-            rect = wdat["walls"][fcell[orl][0]]["s_mid"]
+            blits.append((wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3])))
+        if layer.wall(fcell, orl) >= 0:
+            rect = wdat["walls"][layer.wall(fcell, orl)]["s_mid"]
             if frect is None:
                 # Kinda cheating in that it's known that all walls are the same size.
-                frect = wdat["walls"][fcell[orl][0]]["f_mid"]
+                frect = wdat["walls"][layer.wall(fcell, orl)]["f_mid"]
             hw = int(frect[2]*0.5)
-            lsurf = pygame.transform.flip(wsurf.subsurface(rect), True, False)
-            self.draw_image(lsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)))
-        if fcell[orr][0] >= 0:
-            rect = wdat["walls"][fcell[orr][0]]["s_mid"]
+            blits.append((lwsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)), _MirrorRect(rect, lwsurf)))
+        if layer.wall(fcell, orr) >= 0:
+            rect = wdat["walls"][layer.wall(fcell, orr)]["s_mid"]
             if frect is None:
-                frect = wdat["walls"][fcell[orr][0]]["f_mid"]
+                frect = wdat["walls"][layer.wall(fcell, orr)]["f_mid"]
             hw = int(frect[2]*0.5)
-            self.draw_image(wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3]))
+            blits.append((wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3])))
 
 
-    def _RenderPersClose(self, pos, size, o, orr, orl, cell, wdat, wsurf):
-        fcell = self._getCell(pos[0], pos[1])
-        hsw = int(size[0]*0.5)
-        hsh = int(size[1]*0.5)
+    def _RenderPersClose(self, blits, size, layer, wdat, wsurf, lwsurf):
+        o, orl, orr = self._viewFaces
+        fcell = self._getViewCell(0, 0)
+        if fcell < 0:
+            return
 
-        ovec = self._getOrientVec()
-        lcell = rcell = None
-        if ovec[0] == 0: # Facing North/South
-            lcell = self._getCell(pos[0] + ovec[1], pos[1])
-            rcell = self._getCell(pos[0] - ovec[1], pos[1])
-        else: # Facing East/West
-            lcell = self._getCell(pos[0], pos[1] - ovec[0])
-            rcell = self._getCell(pos[0], pos[1] + ovec[0])
+        lcell = self._getViewCell(0, -1)
+        rcell = self._getViewCell(0, 1)
 
         hsw = int(size[0]*0.5)
         hsh = int(size[1]*0.5)
 
         # Render from outside inwards!
-        if lcell is not None:
-            if lcell[o][0] >= 0:
-                rect = wdat["walls"][lcell[o][0]]["f_close"]
+        if lcell >= 0:
+            if layer.wall(lcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(lcell, o)]["f_close"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
                 rw = hsw - hw
-                self.draw_image(wsurf, (0, hsh-hh), (rect[0]+(rect[2]-rw), rect[1], rw, rect[3])) 
-        if rcell is not None:
-            if rcell[o][0] >= 0:
-                rect = wdat["walls"][rcell[o][0]]["f_close"]
+                blits.append((wsurf, (0, hsh-hh), (rect[0]+(rect[2]-rw), rect[1], rw, rect[3])))
+        if rcell >= 0:
+            if layer.wall(rcell, o) >= 0:
+                rect = wdat["walls"][layer.wall(rcell, o)]["f_close"]
                 hw = int(rect[2]*0.5)
                 hh = int(rect[3]*0.5)
                 rw = hsw - hw
-                self.draw_image(wsurf, (size[0]-rw, hsh-hh), (rect[0], rect[1], rw, rect[3]))
+                blits.append((wsurf, (size[0]-rw, hsh-hh), (rect[0], rect[1], rw, rect[3])))
 
         # Rendering the main cell!!
         frect = None # This will be used to place walls
-        if fcell[o][0] >= 0:
-            idx = fcell[o][0]
+        if layer.wall(fcell, o) >= 0:
+            idx = layer.wall(fcell, o)
             frect = wdat["walls"][idx]["f_close"]
             hw = int(frect[2]*0.5)
             hh = int(frect[3]*0.5)
-            self.draw_image(wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3]))
-        if fcell[orl][0] >= 0:
-            idx = fcell[orl][0]
+            blits.append((wsurf, (hsw-hw, hsh-hh), (frect[0], frect[1], frect[2], frect[3])))
+        if layer.wall(fcell, orl) >= 0:
+            idx = layer.wall(fcell, orl)
             rect = wdat["walls"][idx]["s_close"]
             if frect is None:
                 # Kinda cheating in that it's known that all walls are the same size.
                 frect = wdat["walls"][idx]["f_close"]
             hw = int(frect[2]*0.5)
-            lsurf = pygame.transform.flip(wsurf.subsurface(rect), True, False)
-            self.draw_image(lsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)))
-        if fcell[orr][0] >= 0:
-            idx = fcell[orr][0]
+            blits.append((lwsurf, (hsw-(hw+rect[2]), hsh-int(rect[3]*0.5)), _MirrorRect(rect, lwsurf)))
+        if layer.wall(fcell, orr) >= 0:
+            idx = layer.wall(fcell, orr)
             rect = wdat["walls"][idx]["s_close"]
             if frect is None:
                 frect = wdat["walls"][idx]["f_close"]
             hw = int(frect[2]*0.5)
-            self.draw_image(wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3]))
+            blits.append((wsurf, (hsw+hw, hsh-int(rect[3]*0.5)), (rect[0], rect[1], rect[2], rect[3])))
 
 
     def _RenderPerspective(self):
@@ -695,28 +907,72 @@ class NodeGameMap(gbe.nodes.Node2D):
         wsurf = rm.get("graphic", wdat["src"])
         if ehsurf is None or egsurf is None or wsurf is None:
             return
-        if ehsurf() is None or egsurf() is None or wsurf() is None:
+        # Held strongly for the whole render. Building the mirror below can push graphics over budget, which may
+        # evict any of these from the resource manager.
+        ehsurf = ehsurf()
+        egsurf = egsurf()
+        wsurf = wsurf()
+        if ehsurf is None or egsurf is None or wsurf is None:
+            return
+        # Left side walls are drawn from a mirrored copy of the wall atlas, built once per loaded image.
+        lwsurf = rm.get_derived("graphic", wdat["src"], "mirror", _MirrorSurface)
+        if lwsurf is None:
+            return
+        lwsurf = lwsurf()
+        if lwsurf is None:
             return
 
-        oshift = lambda d: d if d >= 0 and d < 4 else (0 if d > 3 else 3)
-
-        px = self._cellpos[0]
-        py = self._cellpos[1]
-        orl = self._d_n2s(oshift(self._d_s2n(self._orientation) - 1))
-        orr = self._d_n2s(oshift(self._d_s2n(self._orientation) + 1)) 
-
-        cell = self._getCell(px, py)
-
-        # First, output the ground and horizon
-        # TODO Later, perhaps cut the horizon and ground to represent each possible cell instead of just the current one?
-        self.draw_image(ehsurf(), (0,0), edat["horizon"]["defs"][cell["h"]]["rect"])
-        self.draw_image(egsurf(), (0,32), edat["ground"]["defs"][cell["g"]]["rect"])
+        layer = self._layer[self._currentLayer]
+        cell = self._getViewCell(0, 0)
+        if cell < 0:
+            return
 
-        # Rendering the rest
         size = self.resolution
-        self._RenderPersFar((px, py), size, self._orientation, orr, orl, wdat, wsurf())
-        self._RenderPersMid((px, py), size, self._orientation, orr, orl, wdat, wsurf())
-        self._RenderPersClose((px, py), size, self._orientation, orr, orl, cell, wdat, wsurf())
+        sources = (ehsurf, egsurf, wsurf, lwsurf)
+        if self._blitCacheInfo != (size, sources):
+            # Drop everything built against another resolution or since-reloaded graphics.
+            self._invalidateAll()
+            self._blitCacheInfo = (size, sources)
+
+        key = (self._currentLayer, self._cellpos[0], self._cellpos[1], self._orientation)
+        fc = self._frameCache
+        if fc["limit"] > 0:
+            frame = fc["frames"].get(key)
+            if frame is not None:
+                fc["hits"] += 1
+                fc["frames"].move_to_end(key)
+                self.draw_image(frame, (0,0))
+                return
+            fc["misses"] += 1
+
+        blits = self._blitCache.get(key)
+        if blits is not None:
+            self._blitCache.move_to_end(key)
+        else:
+            blits = []
+            # First, output the ground and horizon
+            # TODO Later, perhaps cut the horizon and ground to represent each possible cell instead of just the current one?
+            blits.append((ehsurf, (0,0), edat["horizon"]["defs"][layer.get_horizon(cell)]["rect"]))
+            blits.append((egsurf, (0,32), edat["ground"]["defs"][layer.get_ground(cell)]["rect"]))
+
+            # Rendering the rest
+            self._RenderPersFar(blits, size, layer, wdat, wsurf, lwsurf)
+            self._RenderPersMid(blits, size, layer, wdat, wsurf, lwsurf)
+            self._RenderPersClose(blits, size, layer, wdat, wsurf, lwsurf)
+            if self._blitCacheLimit > 0:
+                self._blitCache[key] = blits
+                self._trimBlitCache()
+
+        if fc["limit"] > 0:
+            frame = pygame.Surface(size, pygame.SRCALPHA, self._ACTIVE_SURF)
+            frame.fill(pygame.Color(0,0,0,0))
+            frame.blits(blits, False)
+            fc["frames"][key] = frame
+            fc["bytes"] += frame.get_width() * frame.get_height() * frame.get_bytesize()
+            self._trimFrameCache()
+            self.draw_image(frame, (0,0))
+        else:
+            self.draw_images(blits)
 
 
     def on_render(self):
@@ -774,6 +1030,7 @@ class NodeMapEditor(gbe.nodes.Node2D):
             raise ValueError("Size must be greater than zero.")
         if size != self._size:
             self._size = size
+            self.mark_dirty()
 
             # Now updating all of the pointer... ummm... points
             hs = max(1, int(size * 0.5))
@@ -794,67 +1051,81 @@ class NodeMapEditor(gbe.nodes.Node2D):
                         self._color = pygame.Color(color[0], color[1], color[2])
                     elif clen == 4 and iscolor(color[3]):
                         self._color = pygame.Color(color[0], color[1], color[2], color[3])
+                    self.mark_dirty()
 
     def get_color(self):
         return (self._color.r, self._color.g, self._color.b, self._color.a)
 
     def on_start(self):
-        self.listen("KEYPRESSED", self.on_keypressed)
+        self.listen("ACTION", self.on_action)
+        if self._filename is not None:
+            self.listen("KEYPRESSED", self.on_keypressed)
 
     def on_pause(self):
+        self.unlisten("ACTION", self.on_action)
         self.unlisten("KEYPRESSED", self.on_keypressed)
 
-    def on_keypressed(self, event, data):
+    def on_action(self, event, data):
         p = self.parent
         if p is None or not isinstance(p, NodeGameMap):
             return
 
-        if data["key_name"] == "escape":
-            if self._filename is None:
-                self.emit("SCENECHANGE", {"scene":"MAIN_MENU", "hold":False})
-            else:
-                self._filename = None
-                self._fnnode.visible = False
-        elif data["key_name"] in ["enter", "return"] and self._filename is not None:
-            if len(self._filename) > 0:
-                if self._fileiomode == 0:
-                    p.save_map(self._filename)
-                else:
-                    p.load_map(self._filename)
-                # Call SAVE on the game map.
-            self._filename = None
-            self._fnnode.visible = False
-
-        if self._filename is None:
-            if data["key_name"] == "tab":
-                p.toggle_render_mode()
-            elif data["key_name"] == "w":
-                p.move_forward(True)
-            elif data["key_name"] == "s":
-                p.move_backward(True)
-            elif data["key_name"] == "a":
-                p.turn_left()
-            elif data["key_name"] == "d":
-                p.turn_right()
-            elif data["key_name"] == "space":
-                o = p.orientation
-                cpos = p.cell_position
-                p.set_cell_face(cpos[0], cpos[1], o)
-            elif data["key_name"] == "e":
-                p.next_wall()
-            elif data["key_name"] == "q":
-                p.prev_wall()
-            elif data["key_name"] in ["o", "l"]:
-                self._fileiomode = 0
-                if data["key_name"] == "l":
-                    self._fileiomode = 1
-                self._filename = ""
-                self._fnnode.text = ""
-                self._fnnode.visible = True
-        elif len(data["key_name"]) == 1:
+        action = data["action"]
+        if self._filename is not None:
+            # Typing a filename. Only confirming or cancelling it counts.
+            if action == "menu_select":
+                if len(self._filename) > 0:
+                    if self._fileiomode == 0:
+                        p.save_map(self._filename)
+                    else:
+                        p.load_map(self._filename)
+                self._endFilename()
+            elif action == "menu_back":
+                self._endFilename()
+            return
+
+        handler = self._ACTIONS.get(action)
+        if handler is not None:
+            handler(self, p)
+
+    def on_keypressed(self, event, data):
+        # Only listened to while typing a filename.
+        if self._filename is not None and len(data["key_name"]) == 1:
             self._filename = "{}{}".format(self._filename, data["key_name"])
             self._fnnode.text = self._filename
 
+    def _startFilename(self, mode):
+        self._fileiomode = mode
+        self._filename = ""
+        self._fnnode.text = ""
+        self._fnnode.visible = True
+        # The key press that got us here has already been handed out, so it won't be typed.
+        self.listen("KEYPRESSED", self.on_keypressed)
+
+    def _endFilename(self):
+        self._filename = None
+        self._fnnode.visible = False
+        self.unlisten("KEYPRESSED", self.on_keypressed)
+
+    def _setWall(self, p):
+        o = p.orientation
+        cpos = p.cell_position
+        p.set_cell_face(cpos[0], cpos[1], o)
+
+    _ACTIONS = {
+        "menu_back":lambda self, p: self.emit("SCENECHANGE", {"scene":"MAIN_MENU", "hold":False}),
+        "editor_toggle_view":lambda self, p: p.toggle_render_mode(),
+        "move_forward":lambda self, p: p.move_forward(True),
+        "move_backward":lambda self, p: p.move_backward(True),
+        "turn_left":lambda self, p: p.turn_left(),
+        "turn_right":lambda self, p: p.turn_right(),
+        "editor_set_wall":_setWall,
+        "editor_next_wall":lambda self, p: p.next_wall(),
+        "editor_prev_wall":lambda self, p: p.prev_wall(),
+        "editor_save":lambda self, p: self._startFilename(0),
+        "editor_load":lambda self, p: self._startFilename(1)
+    }
+
     def on_render(self):
         size = self.resolution
         self.draw_lines(self._getPoints(size), self._color, self._thickness, True)
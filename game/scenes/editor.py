@@ -3,9 +3,17 @@ from .. import gbe
 from ..nodes import *
 
 _TREE = None
+
+def preload():
+    """
+    Starts loading the scene's graphics in the background.
+    """
+    gbe.resource.ResourceManager().preload("graphic", ["maptiles/Walls.png", "maptiles/CeilingsFloors.png"])
+
 def get():
     global _TREE
     if _TREE is None:
+        gbe.actions.Actions.load("bindings.json")
         root = gbe.nodes.NodeSurface("Editor")
         root.scale_to_display = True
         root.keep_aspect_ratio = True
@@ -1,11 +1,14 @@
 
 from .. import gbe
 from ..nodes import *
+from . import editor
 
 _TREE = None
 def get():
     global _TREE
     if _TREE is None:
+        editor.preload() # The editor is the next scene. Decode its graphics while this one is built.
+        gbe.actions.Actions.load("bindings.json")
         root = gbe.nodes.NodeSurface("MAIN_MENU")
         root.scale_to_display = True
         root.keep_aspect_ratio = True
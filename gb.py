@@ -1,9 +1,15 @@
-
+import sys
 import game
 
 
 if __name__ == "__main__":
-    game.start()
+    record = None
+    if "--record" in sys.argv:
+        i = sys.argv.index("--record")
+        record = "logs/session.gbr"
+        if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("--"):
+            record = sys.argv[i + 1]
+    game.start("--profile" in sys.argv, record)
     #app = game.Application()
     #app.init()
     #app.execute()
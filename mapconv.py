@@ -0,0 +1,19 @@
+'''
+    Converts maps between the JSON and binary (.gbm) formats. The output format is picked from the destination's
+    extension.
+
+    python mapconv.py <src> <dst>
+'''
+import sys
+from game import mapfile
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python mapconv.py <src> <dst>")
+        sys.exit(1)
+    try:
+        mapfile.convert(sys.argv[1], sys.argv[2])
+    except (mapfile.MapFileError, OSError) as e:
+        print(e)
+        sys.exit(1)